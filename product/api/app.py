@@ -1,45 +1,92 @@
 import os
 import sys
+import asyncio
+import numpy as np
 
+from time import perf_counter
 from pathlib import Path
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Awaitable, Callable
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from asyncpg import create_pool, Connection, Pool
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from asyncpg import Connection, Pool
 
 sys.path.append(str(Path(__file__).parent.absolute()))
 
-from core import UsersWorker, PlacesWorker, LLMSvc, RecSysSvc, MessagesType, should_recalculate
+from core import UsersWorker, PlacesWorker, CommentsWorker, LLMSvc, RecSysSvc, SvcOverloaded, MessagesType, RecalcQueue, RecommendationCache, RequestDeduplicator, MessagesTypeHistory, SpeculationStats, should_recalculate, apply_migrations, create_workers_pool, install_tracing
 
 DATABASE_URL: str = os.getenv("DATABASE_URL")
-LLM_URL: str = "http://llm:8000"
-RECSYS_URL: str = "http://recsys:8000"
+LLM_URL: str = os.getenv("LLM_URL", "http://llm:8000")
+RECSYS_URL: str = os.getenv("RECSYS_URL", "http://recsys:8000")
+MAX_BULK_COMMENTS: int = int(os.getenv("MAX_BULK_COMMENTS", 5000))
+RECALC_WORKERS: int = int(os.getenv("RECALC_WORKERS", 2))
+RECOMMENDATION_CACHE_SIZE: int = int(os.getenv("RECOMMENDATION_CACHE_SIZE", 10000))
+RECOMMENDATION_CACHE_TTL: float = float(os.getenv("RECOMMENDATION_CACHE_TTL", 300))
+# Как часто проверять поколение оценок в базе: после пересчёта всех пользователей кэш рекомендаций сбрасывается
+RECOMMENDATION_CACHE_SYNC_INTERVAL: float = float(os.getenv("RECOMMENDATION_CACHE_SYNC_INTERVAL", 5))
+RECOMMENDATIONS_PAGE_SIZE: int = 20
+# Повторы одного и того же запроса `/process-messages` в течение `DEDUP_TTL` секунд отдают сохранённый ответ
+DEDUP_SIZE: int = int(os.getenv("DEDUP_SIZE", 10000))
+DEDUP_TTL: float = float(os.getenv("DEDUP_TTL", 10))
+# Бинарный формат (msgpack + float32) запросов к recsys, JSON используется как запасной вариант
+RECSYS_BINARY: bool = os.getenv("RECSYS_BINARY", "1") == "1"
+# Recsys оценивает места по своей копии каталога, получая только id пользователя
+RECSYS_CATALOG_SCORING: bool = os.getenv("RECSYS_CATALOG_SCORING", "1") == "1"
+# full - виртуальная оценка на каждое индексированное место, topk - только лучшие места по корзинам
+VIRTUAL_SCORES_MODE: str = os.getenv("VIRTUAL_SCORES_MODE", "full")
+VIRTUAL_SCORES_TOP_K: int = int(os.getenv("VIRTUAL_SCORES_TOP_K", 100))
+# Спекулятивный запуск извлечения данных параллельно с классификацией сообщений
+SPECULATIVE_LLM: bool = os.getenv("SPECULATIVE_LLM", "0") == "1"
 
 pool: Pool
 users_worker: UsersWorker
 places_worker: PlacesWorker
+comments_worker: CommentsWorker
 llm_svc: LLMSvc
 recsys_svc: RecSysSvc
+recalc_queue: RecalcQueue
+rec_cache: RecommendationCache
+mtype_history: MessagesTypeHistory = MessagesTypeHistory()
+speculation_stats: SpeculationStats = SpeculationStats()
+dedup: RequestDeduplicator = RequestDeduplicator(DEDUP_SIZE, DEDUP_TTL)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    global pool, users_worker, places_worker, llm_svc, recsys_svc
-    pool = await create_pool(dsn=DATABASE_URL, min_size=5, max_size=20)
-    users_worker = UsersWorker(pool)
+    global pool, users_worker, places_worker, comments_worker, llm_svc, recsys_svc, recalc_queue, rec_cache
+    await apply_migrations(DATABASE_URL)
+    pool = await create_workers_pool(DATABASE_URL, min_size=5, max_size=20)
+    rec_cache = RecommendationCache(RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL, RECOMMENDATION_CACHE_SYNC_INTERVAL)
+    users_worker = UsersWorker(pool, on_user_write=rec_cache.invalidate, mode=VIRTUAL_SCORES_MODE, top_k=VIRTUAL_SCORES_TOP_K)
+    await users_worker.publish_mode()
     places_worker = PlacesWorker(pool)
+    comments_worker = CommentsWorker(pool, on_user_write=rec_cache.invalidate)
     llm_svc = LLMSvc(LLM_URL)
-    recsys_svc = RecSysSvc(RECSYS_URL)
+    recsys_svc = RecSysSvc(RECSYS_URL, binary=RECSYS_BINARY)
     if not await llm_svc.check_alive():
         raise ValueError(f"Can't connect to `{llm_svc.svc_url}`")
     if not await recsys_svc.check_alive():
         raise ValueError(f"Can't connect to `{recsys_svc.svc_url}`")
+    recalc_queue = RecalcQueue(recalculate_scores, n_workers=RECALC_WORKERS)
+    recalc_queue.start()
     
     yield
     
+    await recalc_queue.stop()
+    await llm_svc.close()
+    await recsys_svc.close()
     if pool:
         await pool.close()
 
 app: FastAPI = FastAPI(lifespan=lifespan)
+install_tracing(app)
+
+@app.exception_handler(SvcOverloaded)
+async def svc_overloaded(request: Request, e: SvcOverloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "error": str(e)},
+        headers={"Retry-After": str(round(e.retry_after))}
+    )
 
 @app.get("/ping")
 async def ping() -> dict[str, str]:
@@ -58,6 +105,34 @@ async def check_db() -> dict[str, Any]:
     except Exception as e:
         return {"database": "error", "error": str(e)}
 
+@app.get("/stats")
+async def stats() -> dict[str, Any]:
+    return {
+        "llm": llm_svc.pool_stats(),
+        "llm_tokens": llm_svc.usage_stats(),
+        "speculation": speculation_stats.stats(),
+        "recsys": {**recsys_svc.pool_stats(), "binary": recsys_svc.binary},
+        "recalc": recalc_queue.stats(),
+        "virtual_scores": {"mode": users_worker.mode, "top_k": VIRTUAL_SCORES_TOP_K},
+        "recommendation_cache": rec_cache.stats(),
+        "dedup": dedup.stats(),
+        "places_catalog": places_worker.catalog.stats()
+    }
+
+def parse_comment_data(full_data: dict[str, Any]) -> tuple[str, int, str, str, str, str, float, dict[str, str | float]]:
+    user_id: str = full_data["user_id"]
+    place_id: int = full_data["place_id"]
+    name: str = full_data["name"]
+    description: str = full_data["description"]
+    town: str = full_data["town"]
+    place_type: str = full_data["place_type"]
+    score: float = full_data["score"]
+    features: dict[str, str | float] = full_data["features"]
+    for feature in places_worker.FEATURES:
+        if feature not in features:
+            raise ValueError(f"Feature `{feature}` missed")
+    return user_id, place_id, name, description, town, place_type, score, features
+
 # {
 #     "user_id": <user_id>,
 #     "place_id": <place_id>,
@@ -87,27 +162,94 @@ async def check_db() -> dict[str, Any]:
 @app.post("/add-comment-data")
 async def add_comment_data(full_data: dict[str, Any]) -> dict[str, Any]:
     try:
-        user_id: str = full_data["user_id"]
-        place_id: int = full_data["place_id"]
-        name: str = full_data["name"]
-        description: str = full_data["description"]
-        town: str = full_data["town"]
-        place_type: str = full_data["place_type"]
-        score: float = full_data["score"]
-        features: dict[str, str | float] = full_data["features"]
-        for feature in places_worker.FEATURES:
-            if feature not in features:
-                return {"status": "error", "error": f"Feature `{feature}` missed"}
-        await users_worker.add_user(user_id)
-        ok_vote: bool = await users_worker.vote(user_id, place_id, score)
-        if ok_vote:
-            await places_worker.upsert_place(place_id, name, description, town, place_type, features)
+        comment = parse_comment_data(full_data)
+        await comments_worker.add_comment(*comment)
         return {"status": "ok"}
     except KeyError as e:
         return {"status": "error", "error": f"Required key `{e}` missed"}
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    except:
+        return {"status": "error"}
+
+# {
+#     "comments": [
+#         <add-comment-data_request>,
+#         ...
+#     ]
+# }
+@app.post("/add-comments-data")
+async def add_comments_data(request: dict[str, Any]) -> dict[str, Any]:
+    try:
+        comments_data: list[dict[str, Any]] = request["comments"]
+        if len(comments_data) > MAX_BULK_COMMENTS:
+            return {"status": "error", "error": f"Too many comments, limit is {MAX_BULK_COMMENTS}"}
+        results: list[dict[str, str]] = [{"status": "ok"} for _ in comments_data]
+        comments: list[tuple] = []
+        positions: list[int] = []
+        for idx, full_data in enumerate(comments_data):
+            try:
+                comments.append(parse_comment_data(full_data))
+                positions.append(idx)
+            except KeyError as e:
+                results[idx] = {"status": "error", "error": f"Required key `{e}` missed"}
+            except (ValueError, TypeError) as e:
+                results[idx] = {"status": "error", "error": str(e)}
+        rejects = await comments_worker.add_comments(comments)
+        for idx, reject in zip(positions, rejects):
+            if reject is not None:
+                results[idx] = {"status": "error", "error": reject}
+        n_accepted = sum(1 for result in results if result["status"] == "ok")
+        return {
+            "status": "ok",
+            "accepted": n_accepted,
+            "rejected": len(results) - n_accepted,
+            "results": results
+        }
+    except KeyError as e:
+        return {"status": "error", "error": f"Required key `{e}` missed"}
     except:
         return {"status": "error"}
 
+async def store_virtual_scores(user_id: str, places_ids: np.ndarray, scores: np.ndarray) -> None:
+    ids: list[int] = places_ids.tolist()
+    types: list[str] | None = None
+    towns: list[str] | None = None
+    if users_worker.mode == "topk":
+        types, towns = await places_worker.catalog.types_towns(ids)
+    await users_worker.set_virtual_scores(user_id, ids, scores.tolist(), types, towns)
+    await users_worker.clear_unprocessed_votes(user_id)
+
+async def recalculate_scores(user_id: str) -> None:
+    if RECSYS_CATALOG_SCORING:
+        result = await recsys_svc.predict_user_scores(user_id)
+        if result is not None:
+            places_ids, scores = result
+            if len(scores) > 0:
+                await store_virtual_scores(user_id, places_ids, scores)
+            return
+    voted_places = await users_worker.get_voted_places(user_id)
+    scores: list[float] = []
+    for place in voted_places:
+        scores.append(place.pop("score"))
+    voted_features = np.array(
+        [[place.get(field, 0.0) for field in PlacesWorker.FEATURES] for place in voted_places],
+        dtype=np.float32
+    ).reshape(len(voted_places), len(PlacesWorker.FEATURES))
+    _, places_ids, places_features = await places_worker.catalog.indexed()
+    scores = await recsys_svc.predict_scores_matrix(PlacesWorker.FEATURES, voted_features, np.array(scores, dtype=np.float32), places_features)
+    if len(scores) > 0:
+        await store_virtual_scores(user_id, places_ids, scores)
+
+async def save_comment(user_id: str, comment_data: dict[str, Any]) -> dict[str, str]:
+    comment_data["user_id"] = user_id
+    await add_comment_data(comment_data)
+    unproc, total = await users_worker.get_n_votes(user_id)
+    if should_recalculate(unproc, total):
+        # Пока задача в очереди, `best_predicts` отдаёт предыдущие оценки
+        recalc_queue.submit(user_id)
+    return {"status": "ok"}
+
 # {
 #     "user_id": <user_id>,
 #     "messages": [
@@ -124,24 +266,33 @@ async def add_comment(request: dict[str, Any]) -> dict[str, str]:
         user_id: str = request["user_id"]
         messages: list[dict[str, str]] = request["messages"]
         comment_data = await llm_svc.extract_comment_data(messages)
-        comment_data["user_id"] = user_id
-        await add_comment_data(comment_data)
-        unproc, total = await users_worker.get_n_votes(user_id)
-        if should_recalculate(unproc, total):
-            voted_places = await users_worker.get_voted_places(user_id)
-            scores: list[float] = []
-            for place in voted_places:
-                scores.append(place.pop("score"))
-            all_places = await places_worker.all_places()
-            scores = await recsys_svc.predict_scores(voted_places, scores, all_places)
-            if len(scores) > 0:
-                places_ids = [place["place_id"] for place in all_places]
-                await users_worker.set_virtual_scores(user_id, places_ids, scores)
-                await users_worker.clear_unprocessed_votes(user_id)
-        return {"status": "ok"}
+        return await save_comment(user_id, comment_data)
+    except SvcOverloaded:
+        raise
     except:
         return {"status": "error"}
 
+async def recommendations_page(user_id: str, cursor: dict[str, Any] | None, reccomend_data: dict[str, Any]) -> dict[str, Any]:
+    after: tuple[float, int] | None = None
+    if cursor is not None:
+        after = (float(cursor["score"]), int(cursor["place_id"]))
+    allowed_types = reccomend_data["allowed_types"]
+    allowed_towns = reccomend_data["allowed_towns"]
+    await rec_cache.sync(users_worker.scores_generation)
+    cache_key = rec_cache.make_key(user_id, allowed_types, allowed_towns, after)
+    page = rec_cache.get(cache_key)
+    if page is None:
+        generation = rec_cache.generation(user_id)
+        rows = await users_worker.recommend(user_id, RECOMMENDATIONS_PAGE_SIZE, allowed_types, allowed_towns, after)
+        next_cursor = None
+        if len(rows) == RECOMMENDATIONS_PAGE_SIZE:
+            next_cursor = {"score": rows[-1]["score"], "place_id": rows[-1]["place_id"]}
+        meta = [{key: value for key, value in row.items() if key != "score"} for row in rows]
+        page = (meta, next_cursor)
+        rec_cache.put(cache_key, page, generation)
+    meta, next_cursor = page
+    return {"status": "ok", "predicts": meta, "next_cursor": next_cursor}
+
 # {
 #     "user_id": <user_id>,
 #     "messages": [
@@ -150,23 +301,73 @@ async def add_comment(request: dict[str, Any]) -> dict[str, str]:
 #             "content": <content_str>
 #         },
 #         ...
-#     ]
+#     ],
+#     "cursor": <optional_next_cursor_from_previous_page>
 # }
 @app.post("/get-recommendation")
-async def get_recommendation(request: dict[str, Any]) -> dict[str, str]:
+async def get_recommendation(request: dict[str, Any]) -> dict[str, Any]:
     try:
         user_id: str = request["user_id"]
         messages: list[dict[str, str]] = request["messages"]
         reccomend_data = await llm_svc.extract_recommendation_data(messages)
-        disallowed_places = await users_worker.get_voted_place_ids(user_id)
-        allowed_types = reccomend_data["allowed_types"]
-        allowed_towns = reccomend_data["allowed_towns"]
-        best_predicts = await users_worker.best_predicts(user_id, 20, disallowed_places, allowed_types, allowed_towns)
-        meta = await places_worker.get_meta(best_predicts)
-        return {"status": "ok", "predicts": meta}
+        return await recommendations_page(user_id, request.get("cursor"), reccomend_data)
+    except SvcOverloaded:
+        raise
     except:
         return {"status": "error"}
 
+async def timed_extraction(extract: Callable[[list[dict[str, str]]], Awaitable[dict[str, Any]]],
+                           messages: list[dict[str, str]]
+                          ) -> tuple[dict[str, Any], float]:
+    data = await extract(messages)
+    return data, perf_counter()
+
+async def classify_speculatively(user_id: str, messages: list[dict[str, str]]) -> tuple[MessagesType, dict[str, Any] | None]:
+    """
+    Запускает классификацию и извлечение данных для предсказанного по истории типа одновременно.
+    Если предсказание не совпало, извлечение отменяется, а его токены учитываются как лишние
+    (LLM сервис доведёт уже начатый вызов до конца).
+    """
+    extractors = {
+        MessagesType.COMMENT: (llm_svc.extract_comment_data, LLMSvc.COMMENT_DATA_ENDPOINT),
+        MessagesType.RECOMMEND: (llm_svc.extract_recommendation_data, LLMSvc.RECOMMEND_DATA_ENDPOINT)
+    }
+    predicted = mtype_history.predict(user_id)
+    extract, endpoint = extractors[predicted]
+    started = perf_counter()
+    extraction = asyncio.create_task(timed_extraction(extract, messages))
+    extraction.add_done_callback(lambda task: task.cancelled() or task.exception())
+    try:
+        mtype = await llm_svc.classify_messages(messages)
+    except BaseException:
+        extraction.cancel()
+        raise
+    classified = perf_counter()
+    if mtype != predicted:
+        extraction.cancel()
+        speculation_stats.miss(llm_svc.average_tokens(endpoint))
+        return mtype, None
+    data, extracted = await extraction
+    speculation_stats.hit(min(classified, extracted) - started)
+    return mtype, data
+
+async def handle_messages(user_id: str, messages: list[dict[str, str]], cursor: dict[str, Any] | None) -> dict[str, Any]:
+    extracted: dict[str, Any] | None = None
+    if SPECULATIVE_LLM:
+        mtype, extracted = await classify_speculatively(user_id, messages)
+    else:
+        mtype = await llm_svc.classify_messages(messages)
+    mtype_history.record(user_id, mtype)
+    if mtype == MessagesType.COMMENT:
+        if extracted is None:
+            extracted = await llm_svc.extract_comment_data(messages)
+        return await save_comment(user_id, extracted)
+    if mtype == MessagesType.RECOMMEND:
+        if extracted is None:
+            extracted = await llm_svc.extract_recommendation_data(messages)
+        return await recommendations_page(user_id, cursor, extracted)
+    return {"status": "error", "error": "Not enought information provided"}
+
 # {
 #     "user_id": <user_id>,
 #     "messages": [
@@ -182,13 +383,12 @@ async def process_messages(request: dict[str, Any]) -> dict[str, Any]:
     try:
         user_id: str = request["user_id"]
         messages: list[dict[str, str]] = request["messages"]
-        mtype = await llm_svc.classify_messages(messages)
-        if mtype == MessagesType.COMMENT:
-            return await add_comment(request)
-        if mtype == MessagesType.RECOMMEND:
-            return await get_recommendation(request)
-        return {"status": "error", "error": "Not enought information provided"}
+        cursor: dict[str, Any] | None = request.get("cursor")
+        key = dedup.fingerprint(user_id, messages, cursor)
+        return await dedup.run(key, lambda: handle_messages(user_id, messages, cursor))
     except KeyError as e:
         return {"status": "error", "error": f"Required key `{e}` missed"}
+    except SvcOverloaded:
+        raise
     except:
         return {"status": "error"}
\ No newline at end of file
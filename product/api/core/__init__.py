@@ -1,3 +1,8 @@
+from .tracing import *
+from .places_catalog import *
 from .database_utils import *
 from .recalc_euristic import *
-from .services_requests import *
\ No newline at end of file
+from .recalc_queue import *
+from .services_requests import *
+from .speculation import *
+from .caches import *
\ No newline at end of file
@@ -0,0 +1,204 @@
+import json
+import asyncio
+import hashlib
+from time import monotonic
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+__all__ = ["LRUCache", "RecommendationCache", "RequestDeduplicator"]
+
+class LRUCache:
+    """
+    Ограниченный по размеру кэш с вытеснением LRU и временем жизни записей.
+    `on_evict` вызывается с ключом записи, вытесненной по размеру или удалённой по истечении времени жизни.
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, on_evict: Callable[[Hashable], None] | None = None) -> None:
+        self._max_size: int = max_size
+        self._ttl: float = ttl
+        self._on_evict: Callable[[Hashable], None] | None = on_evict
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._hits: int = 0
+        self._misses: int = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is None or item[0] < monotonic():
+            if item is not None:
+                del self._data[key]
+                if self._on_evict is not None:
+                    self._on_evict(key)
+            self._misses += 1
+            return None
+        self._data.move_to_end(key)
+        self._hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (monotonic() + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_size:
+            evicted, _ = self._data.popitem(last=False)
+            if self._on_evict is not None:
+                self._on_evict(evicted)
+
+    def pop(self, key: Hashable) -> Any | None:
+        item = self._data.pop(key, None)
+        return None if item is None else item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "size": len(self._data),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0
+        }
+
+class RecommendationCache:
+    """
+    Кэш итоговых рекомендаций по ключу (пользователь, типы, города).
+    Записи пользователя сбрасываются при любой записи его голосов или виртуальных оценок.
+    Поколение пользователя защищает от сохранения результата, посчитанного до сброса.
+    Поколения хранятся для `max_size` последних сброшенных пользователей; у остальных общее поколение
+    `_floor` - не меньше любого вытесненного, поэтому поколение пользователя никогда не возвращается к прежнему значению.
+    Оценки всех пользователей могут пересчитываться вне процесса: `sync` сбрасывает весь кэш при смене внешнего поколения.
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, sync_interval: float = 5.0) -> None:
+        self._cache: LRUCache = LRUCache(max_size, ttl, on_evict=self._forget)
+        self._sync_interval: float = sync_interval
+        self._last_sync: float = float("-inf")
+        self._external_generation: int | None = None
+        self._clears: int = 0
+        self._user_keys: dict[str, set[tuple]] = {}
+        self._max_generations: int = max_size
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._last_generation: int = 0
+        self._floor: int = 0
+        self._invalidations: int = 0
+
+    @staticmethod
+    def make_key(user_id: str, allowed_types: list[str], allowed_towns: list[str], *extra: Hashable) -> tuple:
+        return (user_id, tuple(sorted(set(allowed_types))), tuple(sorted(set(allowed_towns))), *extra)
+
+    def generation(self, user_id: str) -> int:
+        return self._generations.get(user_id, self._floor)
+
+    def get(self, key: tuple) -> Any | None:
+        return self._cache.get(key)
+
+    def put(self, key: tuple, value: Any, generation: int) -> None:
+        user_id = key[0]
+        if generation != self.generation(user_id):
+            return
+        # Ключ добавляется до записи: если запись сразу вытеснится, `_forget` его уберёт
+        self._user_keys.setdefault(user_id, set()).add(key)
+        self._cache.put(key, value)
+
+    def invalidate(self, user_id: str) -> None:
+        self._last_generation += 1
+        self._generations[user_id] = self._last_generation
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self._max_generations:
+            _, evicted = self._generations.popitem(last=False)
+            self._floor = max(self._floor, evicted)
+        self._invalidations += 1
+        for key in self._user_keys.pop(user_id, set()):
+            self._cache.pop(key)
+
+    def clear(self) -> None:
+        """Сбрасывает все записи; результаты, посчитанные до сброса, не сохраняются."""
+        self._last_generation += 1
+        self._floor = self._last_generation
+        self._generations.clear()
+        self._user_keys.clear()
+        self._cache.clear()
+        self._clears += 1
+
+    async def sync(self, load_generation: Callable[[], Awaitable[int]]) -> None:
+        """Сбрасывает кэш, если внешнее поколение оценок изменилось. Поколение читается не чаще раза в `sync_interval`."""
+        if monotonic() - self._last_sync < self._sync_interval:
+            return
+        self._last_sync = monotonic()
+        generation = await load_generation()
+        if self._external_generation is not None and generation != self._external_generation:
+            self.clear()
+        self._external_generation = generation
+
+    def _forget(self, key: tuple) -> None:
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._cache.stats(),
+            "invalidations": self._invalidations,
+            "clears": self._clears,
+            "tracked_users": len(self._user_keys),
+            "generations": len(self._generations)
+        }
+
+class RequestDeduplicator:
+    """
+    Одинаковые запросы (по отпечатку) выполняются один раз: одновременные дубликаты ждут
+    первое выполнение, повторы в течение `ttl` получают сохранённый результат.
+    Сохраняются только успешные результаты: после исключения или ответа об ошибке (в т.ч. 503 от
+    перегруженного LLM) место освобождается, ожидающие получают ту же ошибку, а повтор выполняется заново.
+    """
+    def __init__(self, max_size: int = 10000, ttl: float = 10.0) -> None:
+        self._results: LRUCache = LRUCache(max_size, ttl)
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._joined: int = 0
+
+    @staticmethod
+    def fingerprint(user_id: str, messages: list[dict[str, str]], *extra: Any) -> str:
+        # Бот пересылает одно и то же окно сообщений, пробелы и регистр роли не меняют запрос
+        normalized = [
+            [str(message.get("role", "")).strip().lower(), " ".join(str(message.get("content", "")).split())]
+            for message in messages
+        ]
+        payload = json.dumps([user_id, normalized, *extra], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def run(self, key: str, execute: Callable[[], Awaitable[Any]]) -> Any:
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        task = self._in_flight.get(key)
+        if task is None:
+            # Отдельная задача: отмена первого запроса не должна отменять выполнение для остальных
+            task = asyncio.ensure_future(execute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._joined += 1
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def succeeded(result: Any) -> bool:
+        """Успешный результат: не `None`, не `{"status": "error"}` и не ответ с кодом вне 2xx."""
+        if result is None:
+            return False
+        status_code = getattr(result, "status_code", None)
+        if status_code is not None:
+            return 200 <= status_code < 300
+        return not (isinstance(result, dict) and result.get("status") == "error")
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        del self._in_flight[key]
+        if not task.cancelled() and task.exception() is None and self.succeeded(task.result()):
+            self._results.put(key, task.result())
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._results.stats(), "joined": self._joined, "in_flight": len(self._in_flight)}
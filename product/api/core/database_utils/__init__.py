@@ -1,2 +1,5 @@
+from .statements import *
 from .user_utils import *
-from .places_utils import *
\ No newline at end of file
+from .places_utils import *
+from .comments_utils import *
+from .migrations import *
\ No newline at end of file
@@ -0,0 +1,226 @@
+from typing import Callable, ClassVar
+from asyncpg import Connection, Pool
+from .places_utils import PlacesWorker, running_means_sql
+from .statements import STATEMENTS
+from ..tracing import timed
+
+__all__ = ["CommentsWorker"]
+
+def _add_comment_sql(features: list[str]) -> str:
+    n_features = len(features)
+    min_votes_param = f"${8 + n_features}::int"
+    feature_params = ", ".join([f"${i + 8}::float8" for i in range(n_features)])
+    feature_updates = running_means_sql(features, separator=",\n                    ")
+    return f"""
+        WITH inserted_vote AS (
+            INSERT INTO votes (user_id, place_id, score)
+            VALUES ($1, $2, $3)
+            ON CONFLICT ON CONSTRAINT unique_user_place_reals
+            DO NOTHING
+            RETURNING vote_id
+        ),
+        upserted_user AS (
+            INSERT INTO users (user_id, unprocessed_votes, total_votes)
+            SELECT $1, COUNT(*), COUNT(*) FROM inserted_vote
+            ON CONFLICT (user_id) DO UPDATE SET
+                unprocessed_votes = users.unprocessed_votes + EXCLUDED.unprocessed_votes,
+                total_votes = users.total_votes + EXCLUDED.total_votes
+            WHERE EXCLUDED.total_votes > 0
+        ),
+        upserted_place AS (
+            INSERT INTO places (place_id, name, description, town, type, total_votes, {', '.join(features)})
+            SELECT $2, $4::text, $5::text, $6::text, $7::text, 1, {feature_params}
+            FROM inserted_vote
+            ON CONFLICT (place_id) DO UPDATE SET
+                name = EXCLUDED.name,
+                description = EXCLUDED.description,
+                town = EXCLUDED.town,
+                type = EXCLUDED.type,
+                total_votes = places.total_votes + 1,
+                {feature_updates},
+                is_indexed = CASE
+                    WHEN (places.total_votes + 1) >= {min_votes_param} THEN TRUE
+                    ELSE places.is_indexed
+                END
+        )
+        SELECT vote_id FROM inserted_vote;
+    """
+
+class CommentsWorker:
+    """
+    Запись комментариев: пользователь, голос и пересчёт средних по месту.
+    Одиночный комментарий пишется одним подготовленным CTE (одна транзакция, один round trip),
+    пакет - через COPY во временную таблицу и слияние множественными запросами.
+    """
+    FEATURES = PlacesWorker.FEATURES
+    ADD_COMMENT: ClassVar[str] = STATEMENTS.register("comments.add_comment", _add_comment_sql(FEATURES))
+
+    def __init__(self, db_pool: Pool, required_votes: int = 3, on_user_write: Callable[[str], None] | None = None) -> None:
+        self._db_pool: Pool = db_pool
+        self._min_votes: int = required_votes
+        self._on_user_write: Callable[[str], None] | None = on_user_write
+        self._create_stage_sql: str = self._build_create_stage_sql()
+        self._merge_stage_sql: str = self._build_merge_stage_sql()
+
+    def _notify_write(self, user_id: str) -> None:
+        if self._on_user_write is not None:
+            self._on_user_write(user_id)
+
+    def _build_create_stage_sql(self) -> str:
+        return f"""
+            CREATE TEMP TABLE comments_stage (
+                row_idx INT NOT NULL,
+                user_id TEXT NOT NULL,
+                place_id BIGINT NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                town TEXT NOT NULL,
+                type TEXT NOT NULL,
+                score FLOAT NOT NULL,
+                {', '.join([f'{field} FLOAT NOT NULL' for field in self.FEATURES])}
+            ) ON COMMIT DROP;
+        """
+
+    def _build_merge_stage_sql(self) -> str:
+        features = ", ".join(self.FEATURES)
+        batch_means = ",\n                    ".join([f"AVG({field}) AS {field}" for field in self.FEATURES])
+        feature_updates = running_means_sql(self.FEATURES, votes="EXCLUDED.total_votes", separator=",\n                    ")
+        # Средние по пакету объединяются с текущими так же, как при последовательных `add_comment`:
+        # новое место индексируется только после второго голоса, как в `PlacesWorker.upsert_place`
+        return f"""
+            WITH first_rows AS (
+                SELECT DISTINCT ON (user_id, place_id) *
+                FROM comments_stage
+                ORDER BY user_id, place_id, row_idx
+            ),
+            inserted_votes AS (
+                INSERT INTO votes (user_id, place_id, score)
+                SELECT user_id, place_id, score FROM first_rows
+                ON CONFLICT ON CONSTRAINT unique_user_place_reals
+                DO NOTHING
+                RETURNING user_id, place_id
+            ),
+            accepted AS (
+                SELECT f.*
+                FROM first_rows f
+                JOIN inserted_votes i ON f.user_id = i.user_id AND f.place_id = i.place_id
+            ),
+            upserted_users AS (
+                INSERT INTO users (user_id, unprocessed_votes, total_votes)
+                SELECT s.user_id, COUNT(a.row_idx), COUNT(a.row_idx)
+                FROM (SELECT DISTINCT user_id FROM comments_stage) s
+                LEFT JOIN accepted a ON a.user_id = s.user_id
+                GROUP BY s.user_id
+                ON CONFLICT (user_id) DO UPDATE SET
+                    unprocessed_votes = users.unprocessed_votes + EXCLUDED.unprocessed_votes,
+                    total_votes = users.total_votes + EXCLUDED.total_votes
+                WHERE EXCLUDED.total_votes > 0
+            ),
+            place_batches AS (
+                SELECT
+                    place_id,
+                    (ARRAY_AGG(name ORDER BY row_idx DESC))[1] AS name,
+                    (ARRAY_AGG(description ORDER BY row_idx DESC))[1] AS description,
+                    (ARRAY_AGG(town ORDER BY row_idx DESC))[1] AS town,
+                    (ARRAY_AGG(type ORDER BY row_idx DESC))[1] AS type,
+                    COUNT(*) AS total_votes,
+                    {batch_means}
+                FROM accepted
+                GROUP BY place_id
+            ),
+            upserted_places AS (
+                INSERT INTO places (place_id, name, description, town, type, total_votes, is_indexed, {features})
+                SELECT
+                    place_id, name, description, town, type, total_votes,
+                    total_votes > 1 AND total_votes >= $1::int,
+                    {features}
+                FROM place_batches
+                ON CONFLICT (place_id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    description = EXCLUDED.description,
+                    town = EXCLUDED.town,
+                    type = EXCLUDED.type,
+                    total_votes = places.total_votes + EXCLUDED.total_votes,
+                    {feature_updates},
+                    is_indexed = CASE
+                        WHEN (places.total_votes + EXCLUDED.total_votes) >= $1::int THEN TRUE
+                        ELSE places.is_indexed
+                    END
+            )
+            SELECT row_idx FROM accepted;
+        """
+
+    @timed("comments.add_comment")
+    async def add_comment(self,
+                          user_id: str,
+                          place_id: int,
+                          name: str,
+                          description: str,
+                          town: str,
+                          place_type: str,
+                          score: float,
+                          vote_values: dict[str, str | float]
+                         ) -> bool:
+        params = [user_id, place_id, score, name, description, town, place_type]
+        for field in self.FEATURES:
+            params.append(float(vote_values.get(field, 0.0)))
+        params.append(self._min_votes)
+        async with self._db_pool.acquire() as conn:
+            conn: Connection
+            result = await conn.fetchval(STATEMENTS.sql(self.ADD_COMMENT), *params)
+        if result is None:
+            return False
+        self._notify_write(user_id)
+        return True
+
+    @timed("comments.add_comments")
+    async def add_comments(self, comments: list[tuple[str, int, str, str, str, str, float, dict[str, str | float]]]) -> list[str | None]:
+        """
+        Пакетная запись комментариев.
+        Возвращает для каждой строки `None` если она принята, иначе причину отказа.
+        """
+        results: list[str | None] = [None] * len(comments)
+        records: list[tuple] = []
+        for idx, (user_id, place_id, name, description, town, place_type, score, vote_values) in enumerate(comments):
+            # Одна некорректная строка не должна отменять COPY всего пакета
+            try:
+                too_long = [
+                    column for column, value, limit in (
+                        ("user_id", user_id, 100),
+                        ("name", name, 255),
+                        ("description", description, 2047),
+                        ("town", town, 255),
+                        ("place_type", place_type, 255)
+                    ) if len(str(value)) > limit
+                ]
+                if too_long:
+                    results[idx] = f"Value of `{too_long[0]}` is too long"
+                    continue
+                record = [idx, str(user_id), int(place_id), str(name), str(description), str(town), str(place_type), float(score)]
+                for field in self.FEATURES:
+                    record.append(float(vote_values.get(field, 0.0)))
+            except (TypeError, ValueError) as e:
+                results[idx] = f"Invalid value: {e}"
+                continue
+            records.append(tuple(record))
+        if not records:
+            return results
+
+        columns = ["row_idx", "user_id", "place_id", "name", "description", "town", "type", "score"] + self.FEATURES
+        async with self._db_pool.acquire() as conn:
+            conn: Connection
+            async with conn.transaction():
+                await conn.execute(self._create_stage_sql)
+                await conn.copy_records_to_table("comments_stage", records=records, columns=columns)
+                rows = await conn.fetch(self._merge_stage_sql, self._min_votes)
+        accepted = {row["row_idx"] for row in rows}
+        for user_id in {record[1] for record in records if record[0] in accepted}:
+            self._notify_write(user_id)
+
+        seen: set[tuple[str, int]] = set()
+        for record in records:
+            idx, key = record[0], (record[1], record[2])
+            if idx not in accepted:
+                results[idx] = "Duplicate vote in batch" if key in seen else "User already voted for this place"
+            seen.add(key)
+        return results
@@ -0,0 +1,49 @@
+from pathlib import Path
+from asyncpg import connect, Connection
+
+__all__ = ["MIGRATIONS_DIR", "apply_migrations"]
+
+MIGRATIONS_DIR: Path = Path(__file__).parents[2] / "migrations"
+
+# Ключ advisory lock, чтобы несколько реплик не применяли миграции одновременно
+MIGRATIONS_LOCK_ID: int = 7262001
+
+async def apply_migrations(dsn: str, migrations_dir: Path = MIGRATIONS_DIR) -> list[str]:
+    """
+    Применяет по порядку ещё не применённые миграции `<version>_<name>.sql`.
+    Каждая миграция выполняется в своей транзакции и записывается в `schema_migrations`.
+    """
+    migrations: list[tuple[int, Path]] = []
+    for path in migrations_dir.glob("*.sql"):
+        version, _, _ = path.stem.partition("_")
+        migrations.append((int(version), path))
+    migrations.sort()
+
+    applied: list[str] = []
+    conn: Connection = await connect(dsn=dsn)
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1);", MIGRATIONS_LOCK_ID)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        rows = await conn.fetch("SELECT version FROM schema_migrations;")
+        done = {row["version"] for row in rows}
+        for version, path in migrations:
+            if version in done:
+                continue
+            async with conn.transaction():
+                await conn.execute(path.read_text())
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2);",
+                    version,
+                    path.stem
+                )
+            applied.append(path.stem)
+    finally:
+        # Закрытие сессии снимает advisory lock
+        await conn.close()
+    return applied
@@ -1,114 +1,86 @@
 from typing import ClassVar, Any
 from asyncpg import Connection, Pool
+from ..places_catalog import FEATURES, PlacesCatalog
+from .statements import STATEMENTS
+from ..tracing import timed
 
-__all__ = ["PlacesWorker"]
+__all__ = ["PlacesWorker", "running_means_sql"]
+
+def running_means_sql(features: list[str], votes: str = "1", separator: str = ",\n                ") -> str:
+    """
+    `SET` признаков места в `ON CONFLICT`: среднее по прежним голосам места и `votes` новым,
+    чьё среднее лежит в `EXCLUDED`. Общий для одиночной записи и пакета, чтобы средние считались одинаково.
+    """
+    return separator.join([
+        f"{field} = CASE "
+        f"WHEN places.total_votes > 0 "
+        f"THEN (places.{field} * places.total_votes + EXCLUDED.{field} * {votes}) / (places.total_votes + {votes}) "
+        f"ELSE EXCLUDED.{field} "
+        f"END"
+        for field in features
+    ])
+
+def _upsert_place_sql(features: list[str]) -> str:
+    # Значения признаков и порог голосов передаются параметрами, чтобы текст запроса не зависел от данных
+    min_votes_param = f"${6 + len(features)}::int"
+    feature_updates = running_means_sql(features)
+    return f"""
+        INSERT INTO places (place_id, name, description, town, type, total_votes, {', '.join(features)})
+        VALUES (
+            $1, $2, $3, $4, $5,
+            1,
+            {', '.join([f'${i + 6}::float8' for i in range(len(features))])}
+        )
+        ON CONFLICT (place_id) DO UPDATE SET
+            name = EXCLUDED.name,
+            description = EXCLUDED.description,
+            town = EXCLUDED.town,
+            type = EXCLUDED.type,
+            total_votes = places.total_votes + 1,
+            {feature_updates},
+            is_indexed = CASE
+                WHEN (places.total_votes + 1) >= {min_votes_param} THEN TRUE
+                ELSE places.is_indexed
+            END
+        RETURNING *
+    """
 
 class PlacesWorker:
-    FEATURES: ClassVar[list[str]] = [
-        "natural_scenery",
-        "cultural_richness",
-        "adventure_level",
-        "family_friendliness",
-        "beach_quality",
-        "mountain_terrain",
-        "urban_vibrancy",
-        "food_variety",
-        "accommodation_quality",
-        "transportation_accessibility",
-        "cost_level",
-        "safety",
-        "relaxation_level",
-        "nightlife_intensity",
-        "historical_significance"
-    ]
+    FEATURES: ClassVar[list[str]] = FEATURES
+    UPSERT_PLACE: ClassVar[str] = STATEMENTS.register("places.upsert_place", _upsert_place_sql(FEATURES))
         
     def __init__(self, db_pool: Pool, required_votes: int = 3) -> None:
         self._db_pool: Pool = db_pool
         self._min_votes: int = required_votes
+        self._catalog: PlacesCatalog = PlacesCatalog(db_pool, self.FEATURES)
 
+    @property
+    def catalog(self) -> PlacesCatalog:
+        return self._catalog
+
+    @timed("places.upsert_place")
     async def upsert_place(self, place_id: int, name: str, description: str, town: str, place_type: str, vote_values: dict[str, str | float]) -> None:
+        params = [place_id, name, description, town, place_type]
+        for field in self.FEATURES:
+            params.append(float(vote_values.get(field, 0.0)))
+        params.append(self._min_votes)
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            set_parts = [
-                "name = EXCLUDED.name",
-                "description = EXCLUDED.description"
-                "town = EXCLUDED.town",
-                "type = EXCLUDED.type",
-                "total_votes = places.total_votes + 1"
-            ]
-            for field in self.FEATURES:
-                new_vote = vote_values.get(field, 0.0)
-                set_parts.append(
-                    f"{field} = CASE "
-                    f"WHEN places.total_votes > 0 "
-                    f"THEN (places.{field} * places.total_votes + {new_vote}) / (places.total_votes + 1) "
-                    f"ELSE {new_vote} "
-                    f"END"
-                )
-            set_parts.append(
-                f"is_indexed = CASE "
-                f"WHEN (places.total_votes + 1) >= {self._min_votes} THEN TRUE "
-                f"ELSE places.is_indexed "
-                f"END"
-            )
-            sql_template = f"""
-                INSERT INTO places (place_id, name, description, town, type, total_votes, {', '.join(self.FEATURES)})
-                VALUES (
-                    $1, $2, $3, $4, $5,
-                    1, 
-                    {', '.join([f'${i+6}' for i in range(len(self.FEATURES))])}
-                )
-                ON CONFLICT (place_id) DO UPDATE SET
-                    {', '.join(set_parts)}
-                RETURNING *
-            """
-            params = [place_id, name, description, town, place_type]
-            for field in self.FEATURES:
-                params.append(vote_values.get(field, 0.0))
-                await conn.fetchrow(sql_template, *params)
+            await conn.fetchrow(STATEMENTS.sql(self.UPSERT_PLACE), *params)
         
+    @timed("places.all_places")
     async def all_places(self) -> list[dict[str, Any]]:
-        columns = ["place_id", "type"] + self.FEATURES
-        sql_template = f"""
-            SELECT {', '.join(columns)}
-            FROM places
-            WHERE is_indexed = TRUE
-            ORDER BY place_id;
-        """
-        async with self._db_pool.acquire() as conn:
-            conn: Connection
-            rows = await conn.fetch(sql_template)
-            places_list = []
-            for row in rows:
-                place_dict = {}
-                for column in columns:
-                    place_dict[column] = row[column]
-                places_list.append(place_dict)
-            return places_list
-        return []
+        _, place_ids, features = await self._catalog.indexed()
+        types, _ = await self._catalog.types_towns(place_ids.tolist())
+        places_list = []
+        for place_id, place_type, values in zip(place_ids.tolist(), types, features.tolist()):
+            place_dict = {"place_id": place_id, "type": place_type}
+            place_dict.update(zip(self.FEATURES, values))
+            places_list.append(place_dict)
+        return places_list
         
+    @timed("places.get_meta")
     async def get_meta(self, place_ids: list[int]) -> list[dict[str, Any]]:
         if not place_ids:
             return []
-        
-        sql_template = """
-            SELECT place_id, name, description, town, type
-            FROM places
-            WHERE place_id = ANY($1::bigint[])
-            ORDER BY place_id;
-        """
-        async with self._db_pool.acquire() as conn:
-            conn: Connection
-            rows = await conn.fetch(sql_template, place_ids)
-            meta_list = []
-            for row in rows:
-                meta_dict = {
-                    "place_id": row["place_id"],
-                    "name": row["name"],
-                    "description": row["description"],
-                    "town": row["town"],
-                    "type": row["type"]
-                }
-                meta_list.append(meta_dict)
-            return meta_list
-        return []
\ No newline at end of file
+        return await self._catalog.meta(place_ids)
\ No newline at end of file
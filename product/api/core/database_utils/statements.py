@@ -0,0 +1,45 @@
+from typing import Any
+from asyncpg import create_pool, Connection, Pool
+
+__all__ = ["StatementsRegistry", "STATEMENTS", "create_workers_pool"]
+
+class StatementsRegistry:
+    """
+    Именованные SQL запросы воркеров. Запросы регистрируются при импорте модулей воркеров,
+    т.е. до создания первого соединения, и разбираются на каждом новом соединении в `init` хуке пула
+    прямо в кэш запросов соединения asyncpg. Воркеры выполняют запросы по тексту `sql(name)` и берут
+    их из этого кэша: Parse идёт один раз на соединение, при его открытии, а не в первом запросе пользователя.
+    Объекты `PreparedStatement` в реестре не хранятся - asyncpg инвалидирует их при каждом возврате соединения в пул.
+    """
+    def __init__(self) -> None:
+        self._sql: dict[str, str] = {}
+
+    def register(self, name: str, sql: str) -> str:
+        if name in self._sql and self._sql[name] != sql:
+            raise ValueError(f"Statement `{name}` already registered with another SQL")
+        self._sql[name] = sql
+        return name
+
+    def sql(self, name: str) -> str:
+        return self._sql[name]
+
+    async def prepare(self, conn: Connection) -> None:
+        # Запрос, не совпадающий со схемой, ломает создание соединения, а не первый запрос пользователя.
+        # asyncpg завершает подготовку сообщением Flush, а не Sync: без явной транзакции неявная
+        # остаётся открытой до первого запроса и держит блокировки всех таблиц реестра
+        async with conn.transaction():
+            for sql in self._sql.values():
+                # `Connection.prepare` кэш обходит, а `fetch` ищет запрос в кэше по тексту и типу записи
+                # по умолчанию - подготовка через `_get_statement` кладёт его под тем же ключом
+                await conn._get_statement(sql, None)
+
+    def __len__(self) -> int:
+        return len(self._sql)
+
+STATEMENTS: StatementsRegistry = StatementsRegistry()
+
+async def create_workers_pool(dsn: str, **kwargs: Any) -> Pool:
+    # Кэш соединения должен вмещать весь реестр и ad-hoc запросы, а записи не должны истекать по времени
+    kwargs.setdefault("statement_cache_size", max(100, 2 * len(STATEMENTS)))
+    kwargs.setdefault("max_cached_statement_lifetime", 0)
+    return await create_pool(dsn=dsn, init=STATEMENTS.prepare, **kwargs)
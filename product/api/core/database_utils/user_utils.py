@@ -1,125 +1,390 @@
-from typing import Any
+from itertools import product
+from typing import Any, Callable, ClassVar, Sequence
+import numpy as np
 from asyncpg import Connection, Pool, Record
+from .statements import STATEMENTS
+from ..tracing import timed
 
-__all__ = ["UsersWorker"]
+__all__ = ["VIRTUAL_SCORES_MODES", "top_k_buckets", "UsersWorker"]
+
+# full - оценка на каждое индексированное место, topk - только лучшие места по корзинам
+VIRTUAL_SCORES_MODES: tuple[str, ...] = ("full", "topk")
+
+def _filters_sql(first_param: int, with_types: bool, with_towns: bool) -> list[str]:
+    # Фильтры подставляются только когда заданы: условие вида `CARDINALITY($3) = 0 OR ...`
+    # не даёт планировщику выбрать индекс в общем (generic) плане подготовленного запроса
+    conditions: list[str] = []
+    param = first_param
+    if with_types:
+        conditions.append(f"p.type = ANY(${param}::text[])")
+        param += 1
+    if with_towns:
+        conditions.append(f"p.town = ANY(${param}::text[])")
+    return conditions
+
+def _best_predicts_sql(with_types: bool, with_towns: bool) -> str:
+    conditions = ["vs.user_id = $1", "vs.place_id != ALL($2::bigint[])"] + _filters_sql(4, with_types, with_towns)
+    return f"""
+        SELECT vs.place_id
+        FROM virtual_scores vs
+        INNER JOIN places p ON vs.place_id = p.place_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY vs.score DESC, vs.place_id
+        LIMIT $3;
+    """
+
+def _recommend_sql(with_types: bool, with_towns: bool, with_after: bool) -> str:
+    conditions = [
+        "vs.user_id = $1",
+        "NOT EXISTS (SELECT 1 FROM votes v WHERE v.user_id = $1 AND v.place_id = vs.place_id)"
+    ] + _filters_sql(3, with_types, with_towns)
+    if with_after:
+        score_param = f"${3 + with_types + with_towns}::float8"
+        place_param = f"${4 + with_types + with_towns}::bigint"
+        # Первое условие отдельно, чтобы оно стало границей сканирования индекса по (user_id, score DESC, place_id)
+        conditions.append(f"vs.score <= {score_param}")
+        conditions.append(f"(vs.score < {score_param} OR vs.place_id > {place_param})")
+    return f"""
+        SELECT vs.score, p.place_id, p.name, p.description, p.town, p.type
+        FROM virtual_scores vs
+        INNER JOIN places p ON vs.place_id = p.place_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY vs.score DESC, vs.place_id
+        LIMIT $2;
+    """
+
+def _topk_sql(columns: str, conditions: list[str], with_both: bool) -> str:
+    buckets = "t.bucket_type = ANY($3::text[]) AND t.bucket_town = ANY($4::text[])"
+    if with_both:
+        # Пара (тип, город) хранится, только если обе её корзины обрезаны,
+        # иначе места пары берутся из полной корзины города или типа
+        buckets = f"""(
+            ({buckets})
+            OR (t.complete AND t.bucket_type = '' AND t.bucket_town = ANY($4::text[]) AND p.type = ANY($3::text[]))
+            OR (t.complete AND t.bucket_town = '' AND t.bucket_type = ANY($3::text[]) AND p.town = ANY($4::text[]))
+        )"""
+    # Место может найтись и в полной корзине города, и в полной корзине типа
+    distinct = "DISTINCT " if with_both else ""
+    return f"""
+        SELECT {distinct}{columns}
+        FROM virtual_scores_topk t
+        CROSS JOIN LATERAL unnest(t.place_ids, t.scores) AS s(place_id, score)
+        INNER JOIN places p ON s.place_id = p.place_id
+        WHERE {' AND '.join(["t.user_id = $1", buckets] + conditions)}
+        ORDER BY s.score DESC, s.place_id
+        LIMIT $2;
+    """
+
+def _topk_best_predicts_sql(with_both: bool) -> str:
+    return _topk_sql("s.score, s.place_id", ["s.place_id != ALL($5::bigint[])"], with_both)
+
+def _topk_recommend_sql(with_both: bool, with_after: bool) -> str:
+    conditions = ["NOT EXISTS (SELECT 1 FROM votes v WHERE v.user_id = $1 AND v.place_id = s.place_id)"]
+    if with_after:
+        conditions.append("s.score <= $5::float8")
+        conditions.append("(s.score < $5::float8 OR s.place_id > $6::bigint)")
+    return _topk_sql("s.score, s.place_id, p.name, p.description, p.town, p.type", conditions, with_both)
+
+def _top_rows(codes: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # `codes` уже упорядочены по убыванию оценки, стабильная сортировка сохраняет этот порядок внутри корзины.
+    # Возвращает строки первых `k` мест каждой корзины и размеры корзин
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    rank = np.arange(len(codes)) - np.searchsorted(sorted_codes, sorted_codes, side="left")
+    return np.sort(order[rank < k]), np.bincount(codes)
+
+def top_k_buckets(places: Sequence[int],
+                  scores: Sequence[float],
+                  types: Sequence[str],
+                  towns: Sequence[str],
+                  k: int
+                 ) -> tuple[list[str], list[str], list[bool], list[int], list[float]]:
+    """
+    Лучшие `k` мест в общей корзине, в корзинах по типу, по городу и по паре (тип, город).
+    Корзина полная, если в ней все места; пары с полной корзиной типа или города не хранятся.
+    Возвращает плоские колонки (тип, город, полнота корзины, место, оценка) для `UsersWorker.SET_TOPK_SCORES`.
+    Места с неизвестным типом или городом попадают только в корзины без этого фильтра.
+    """
+    ids = np.asarray(places, dtype=np.int64)
+    values = np.asarray(scores, dtype=np.float64)
+    order = np.lexsort((ids, -values))
+    ids, values = ids[order], values[order]
+    types_arr = np.asarray(types, dtype=object)[order]
+    towns_arr = np.asarray(towns, dtype=object)[order]
+
+    complete: dict[tuple[str, str], bool] = {}
+    columns: tuple[list, ...] = ([], [], [], [], [])
+    no_filter = np.full(len(ids), "", dtype=object)
+    for by_type, by_town in product((False, True), repeat=2):
+        valid = np.ones(len(ids), dtype=bool)
+        if by_type:
+            valid &= types_arr != ""
+        if by_town:
+            valid &= towns_arr != ""
+        if by_type and by_town:
+            valid &= ~np.fromiter((complete.get((place_type, ""), True) for place_type in types_arr), dtype=bool, count=len(ids))
+            valid &= ~np.fromiter((complete.get(("", town), True) for town in towns_arr), dtype=bool, count=len(ids))
+        rows = np.flatnonzero(valid)
+        if len(rows) == 0:
+            continue
+        bucket_types = (types_arr if by_type else no_filter)[rows]
+        bucket_towns = (towns_arr if by_town else no_filter)[rows]
+        index: dict[tuple[str, str], int] = {}
+        codes = np.fromiter(
+            (index.setdefault(key, len(index)) for key in zip(bucket_types, bucket_towns)),
+            dtype=np.int64,
+            count=len(rows)
+        )
+        top, sizes = _top_rows(codes, k)
+        is_complete = sizes <= k
+        complete.update(zip(index, is_complete.tolist()))
+        columns[0].extend(bucket_types[top].tolist())
+        columns[1].extend(bucket_towns[top].tolist())
+        columns[2].extend(is_complete[codes[top]].tolist())
+        columns[3].extend(ids[rows[top]].tolist())
+        columns[4].extend(values[rows[top]].tolist())
+    return columns
+
+# Запросы к временной таблице не регистрируются в `STATEMENTS`: её нет, пока соединение готовит запросы
+_CREATE_SCORES_STAGE_SQL: str = """
+    CREATE TEMP TABLE virtual_scores_stage (
+        place_id BIGINT NOT NULL,
+        score FLOAT NOT NULL
+    ) ON COMMIT DROP;
+"""
+_INSERT_STAGED_SCORES_SQL: str = """
+    INSERT INTO virtual_scores (user_id, place_id, score)
+    SELECT $1, place_id, score
+    FROM virtual_scores_stage;
+"""
 
 class UsersWorker:
-    def __init__(self, db_pool: Pool) -> None:
+    ADD_USER: ClassVar[str] = STATEMENTS.register("users.add_user", """
+        INSERT INTO users (user_id) 
+        VALUES ($1) 
+        ON CONFLICT (user_id) DO NOTHING;
+    """)
+    VOTE: ClassVar[str] = STATEMENTS.register("users.vote", """
+        WITH inserted_vote AS (
+            INSERT INTO votes (user_id, place_id, score)
+            VALUES ($1, $2, $3)
+            ON CONFLICT ON CONSTRAINT unique_user_place_reals
+            DO NOTHING
+            RETURNING vote_id, user_id
+        )
+        UPDATE users
+        SET unprocessed_votes = unprocessed_votes + 1,
+            total_votes = total_votes + 1
+        WHERE user_id = (SELECT user_id FROM inserted_vote)
+        RETURNING (SELECT vote_id FROM inserted_vote);
+    """)
+    GET_N_VOTES: ClassVar[str] = STATEMENTS.register("users.get_n_votes", """
+        SELECT unprocessed_votes, total_votes 
+        FROM users 
+        WHERE user_id = $1;
+    """)
+    CLEAR_UNPROCESSED_VOTES: ClassVar[str] = STATEMENTS.register("users.clear_unprocessed_votes", """
+        UPDATE users 
+        SET unprocessed_votes = 0 
+        WHERE user_id = $1;
+    """)
+    GET_VOTED_PLACE_IDS: ClassVar[str] = STATEMENTS.register("users.get_voted_place_ids", """
+        SELECT place_id 
+        FROM votes 
+        WHERE user_id = $1 
+        ORDER BY vote_id;
+    """)
+    GET_VOTED_PLACES: ClassVar[str] = STATEMENTS.register("users.get_voted_places", """
+        SELECT 
+            v.vote_id,
+            v.user_id,
+            v.place_id,
+            v.score,
+            p.*
+        FROM votes v
+        JOIN places p ON v.place_id = p.place_id
+        WHERE v.user_id = $1
+        ORDER BY v.vote_id;
+    """)
+    # Замены оценок одного пользователя из разных процессов выполняются по очереди:
+    # иначе обе транзакции удалят старые строки и вставят свои, нарушив уникальность
+    LOCK_USER_SCORES: ClassVar[str] = STATEMENTS.register("users.lock_user_scores", """
+        SELECT pg_advisory_xact_lock(hashtextextended($1, 0));
+    """)
+    CLEAR_VIRTUAL_SCORES: ClassVar[str] = STATEMENTS.register("users.clear_virtual_scores", """
+        DELETE FROM virtual_scores
+        WHERE user_id = $1;
+    """)
+    CLEAR_TOPK_SCORES: ClassVar[str] = STATEMENTS.register("users.clear_topk_scores", """
+        DELETE FROM virtual_scores_topk
+        WHERE user_id = $1;
+    """)
+    SET_TOPK_SCORES: ClassVar[str] = STATEMENTS.register("users.set_topk_scores", """
+        INSERT INTO virtual_scores_topk (user_id, bucket_type, bucket_town, complete, place_ids, scores)
+        SELECT
+            $1,
+            b.bucket_type,
+            b.bucket_town,
+            bool_and(b.complete),
+            array_agg(b.place_id ORDER BY b.score DESC, b.place_id),
+            array_agg(b.score::real ORDER BY b.score DESC, b.place_id)
+        FROM unnest($2::text[], $3::text[], $4::bool[], $5::bigint[], $6::float8[]) AS b(bucket_type, bucket_town, complete, place_id, score)
+        GROUP BY b.bucket_type, b.bucket_town;
+    """)
+    # Режим хранения публикуется в базе для задач вне api, см. миграцию `0005_virtual_scores_state`
+    PUBLISH_SCORES_MODE: ClassVar[str] = STATEMENTS.register("users.publish_scores_mode", """
+        UPDATE virtual_scores_state
+        SET mode = $1;
+    """)
+    GET_SCORES_GENERATION: ClassVar[str] = STATEMENTS.register("users.get_scores_generation", """
+        SELECT generation
+        FROM virtual_scores_state;
+    """)
+    BEST_PREDICTS: ClassVar[dict[tuple[bool, bool], str]] = {
+        (types, towns): STATEMENTS.register(f"users.best_predicts.{types:d}{towns:d}", _best_predicts_sql(types, towns))
+        for types, towns in product((False, True), repeat=2)
+    }
+    RECOMMEND: ClassVar[dict[tuple[bool, bool, bool], str]] = {
+        (types, towns, after): STATEMENTS.register(f"users.recommend.{types:d}{towns:d}{after:d}", _recommend_sql(types, towns, after))
+        for types, towns, after in product((False, True), repeat=3)
+    }
+    BEST_PREDICTS_TOPK: ClassVar[dict[bool, str]] = {
+        both: STATEMENTS.register(f"users.best_predicts_topk.{both:d}", _topk_best_predicts_sql(both))
+        for both in (False, True)
+    }
+    RECOMMEND_TOPK: ClassVar[dict[tuple[bool, bool], str]] = {
+        (both, after): STATEMENTS.register(f"users.recommend_topk.{both:d}{after:d}", _topk_recommend_sql(both, after))
+        for both, after in product((False, True), repeat=2)
+    }
+
+    def __init__(self,
+                 db_pool: Pool,
+                 on_user_write: Callable[[str], None] | None = None,
+                 mode: str = "full",
+                 top_k: int = 100
+                ) -> None:
+        if mode not in VIRTUAL_SCORES_MODES:
+            raise ValueError(f"Unknown virtual scores mode `{mode}`, expected one of {VIRTUAL_SCORES_MODES}")
         self._db_pool: Pool = db_pool
+        # Вызывается после записи голосов или виртуальных оценок пользователя
+        self._on_user_write: Callable[[str], None] | None = on_user_write
+        self._mode: str = mode
+        # В режиме topk страницы рекомендаций заканчиваются на `top_k` местах корзины
+        self._top_k: int = top_k
 
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    async def publish_mode(self) -> None:
+        async with self._db_pool.acquire() as conn:
+            conn: Connection
+            await conn.execute(STATEMENTS.sql(self.PUBLISH_SCORES_MODE), self._mode)
+
+    async def scores_generation(self) -> int:
+        """Поколение оценок: растёт после пересчёта оценок всех пользователей вне api (`recompute_scores.py` в recsys)."""
+        async with self._db_pool.acquire() as conn:
+            conn: Connection
+            return await conn.fetchval(STATEMENTS.sql(self.GET_SCORES_GENERATION))
+
+    def _notify_write(self, user_id: str) -> None:
+        if self._on_user_write is not None:
+            self._on_user_write(user_id)
+
+    @timed("users.add_user")
     async def add_user(self, user_id: str) -> None:
-        sql_template = f"""
-            INSERT INTO users (user_id) 
-            VALUES ($1) 
-            ON CONFLICT (user_id) DO NOTHING;
-        """
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            await conn.fetchval(sql_template, user_id)
+            await conn.fetchval(STATEMENTS.sql(self.ADD_USER), user_id)
 
+    @timed("users.vote")
     async def vote(self, user_id: str, place_id: int, score: float) -> bool:
-        sql_template = """
-            WITH inserted_vote AS (
-                INSERT INTO votes (user_id, place_id, score)
-                VALUES ($1, $2, $3)
-                ON CONFLICT ON CONSTRAINT unique_user_place_reals
-                DO NOTHING
-                RETURNING vote_id, user_id
-            )
-            UPDATE users
-            SET unprocessed_votes = unprocessed_votes + 1,
-                total_votes = total_votes + 1
-            WHERE user_id = (SELECT user_id FROM inserted_vote)
-            RETURNING (SELECT vote_id FROM inserted_vote);
-        """
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            result = await conn.fetchval(sql_template, user_id, place_id, score)
-            return result is not None
-        return False
+            result = await conn.fetchval(STATEMENTS.sql(self.VOTE), user_id, place_id, score)
+        if result is None:
+            return False
+        self._notify_write(user_id)
+        return True
     
+    @timed("users.get_n_votes")
     async def get_n_votes(self, user_id: str) -> tuple[int, int]:
-        sql_template = """
-            SELECT unprocessed_votes, total_votes 
-            FROM users 
-            WHERE user_id = $1;
-        """
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            result = await conn.fetchrow(sql_template, user_id)
+            result = await conn.fetchrow(STATEMENTS.sql(self.GET_N_VOTES), user_id)
             
             if result:
                 return result["unprocessed_votes"], result["total_votes"]
             return 0, 0
         
+    @timed("users.clear_unprocessed_votes")
     async def clear_unprocessed_votes(self, user_id: str) -> None:
-        sql_template = """
-            UPDATE users 
-            SET unprocessed_votes = 0 
-            WHERE user_id = $1;
-        """
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            await conn.execute(sql_template, user_id)
+            await conn.fetchval(STATEMENTS.sql(self.CLEAR_UNPROCESSED_VOTES), user_id)
 
+    @timed("users.get_voted_place_ids")
     async def get_voted_place_ids(self, user_id: str) -> list[int]:
-        sql_template = """
-            SELECT place_id 
-            FROM votes 
-            WHERE user_id = $1 
-            ORDER BY vote_id;
-        """
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            rows = await conn.fetch(sql_template, user_id)
+            rows = await conn.fetch(STATEMENTS.sql(self.GET_VOTED_PLACE_IDS), user_id)
             return [row["place_id"] for row in rows]
         
+    @timed("users.get_voted_places")
     async def get_voted_places(self, user_id: str) -> list[dict[str, Any]]:
-        sql_template = """
-            SELECT 
-                v.vote_id,
-                v.user_id,
-                v.place_id,
-                v.score,
-                p.*
-            FROM votes v
-            JOIN places p ON v.place_id = p.place_id
-            WHERE v.user_id = $1
-            ORDER BY v.vote_id;
-        """
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            rows: list[Record] = await conn.fetch(sql_template, user_id)
+            rows: list[Record] = await conn.fetch(STATEMENTS.sql(self.GET_VOTED_PLACES), user_id)
             votes_list: list[dict[str, Any]] = []
             for row in rows:
-                place_dict = {
+                place_dict: dict[str, Any] = {
                     "score": row["score"]
                 }
-                place_dict: dict[str, Any] = {}
                 for key in row.keys():
-                    if key not in ["vote_id", "user_id", "place_id", "score", "total_votes", "is_indexed"]:
+                    if key not in ["vote_id", "user_id", "place_id", "score", "total_votes", "is_indexed", "updated_at"]:
                         place_dict[key] = row[key]
-                place_dict["place"] = place_dict
                 votes_list.append(place_dict)
             return votes_list
         
-    async def set_virtual_scores(self, user_id: str, places: list[int], scores: list[float]) -> None:
+    @timed("users.set_virtual_scores")
+    async def set_virtual_scores(self,
+                                 user_id: str,
+                                 places: list[int],
+                                 scores: list[float],
+                                 types: list[str] | None = None,
+                                 towns: list[str] | None = None
+                                ) -> None:
+        """Заменяет оценки пользователя. В режиме topk нужны типы и города мест для корзин."""
         if len(places) != len(scores):
             raise ValueError("Length of places and scores must be equal")
         
         if not places:
             return
         
-        sql_template = """
-            INSERT INTO virtual_scores (user_id, place_id, score)
-            SELECT $1, unnest($2::bigint[]), unnest($3::float[])
-            ON CONFLICT ON CONSTRAINT unique_user_place_virtuals
-            DO UPDATE SET score = EXCLUDED.score;
-        """
-        async with self._db_pool.acquire() as conn:
-            conn: Connection
-            await conn.execute(sql_template, user_id, places, scores)
+        if self._mode == "topk":
+            if types is None or towns is None or len(types) != len(places) or len(towns) != len(places):
+                raise ValueError("Types and towns of every place are required in `topk` mode")
+            buckets = top_k_buckets(places, scores, types, towns, self._top_k)
+            async with self._db_pool.acquire() as conn:
+                conn: Connection
+                async with conn.transaction():
+                    await conn.fetchval(STATEMENTS.sql(self.LOCK_USER_SCORES), user_id)
+                    await conn.fetchval(STATEMENTS.sql(self.CLEAR_TOPK_SCORES), user_id)
+                    await conn.fetchval(STATEMENTS.sql(self.SET_TOPK_SCORES), user_id, *buckets)
+        else:
+            # Оценки пользователя заменяются целиком: COPY во временную таблицу, затем удаление и вставка в его секции
+            records = [(int(place_id), float(score)) for place_id, score in zip(places, scores)]
+            async with self._db_pool.acquire() as conn:
+                conn: Connection
+                async with conn.transaction():
+                    await conn.execute(_CREATE_SCORES_STAGE_SQL)
+                    await conn.copy_records_to_table("virtual_scores_stage", records=records, columns=["place_id", "score"])
+                    await conn.fetchval(STATEMENTS.sql(self.LOCK_USER_SCORES), user_id)
+                    await conn.fetchval(STATEMENTS.sql(self.CLEAR_VIRTUAL_SCORES), user_id)
+                    await conn.execute(_INSERT_STAGED_SCORES_SQL, user_id)
+        self._notify_write(user_id)
 
+    @timed("users.best_predicts")
     async def best_predicts(self, 
                             user_id: str, 
                             n_places: int, 
@@ -127,26 +392,50 @@ class UsersWorker:
                             allowed_types: list[str], 
                             allowed_towns: list[str]
                            ) -> list[int]:
-        sql_template = """
-            SELECT vs.place_id
-            FROM virtual_scores vs
-            INNER JOIN places p ON vs.place_id = p.place_id
-            WHERE vs.user_id = $1
-              AND vs.place_id != ALL($2::bigint[])
-              AND (CARDINALITY($3::text[]) = 0 OR p.type = ANY($3::text[]))
-              AND (CARDINALITY($4::text[]) = 0 OR p.town = ANY($4::text[]))
-            ORDER BY vs.score DESC, vs.place_id
-            LIMIT $5;
-        """
+        if self._mode == "topk":
+            # Пустой список фильтра выбирает корзину без этого фильтра
+            params: list[Any] = [user_id, n_places, allowed_types or [""], allowed_towns or [""], disallowed_places]
+            statement = self.BEST_PREDICTS_TOPK[bool(allowed_types) and bool(allowed_towns)]
+        else:
+            params = [user_id, disallowed_places, n_places]
+            if allowed_types:
+                params.append(allowed_types)
+            if allowed_towns:
+                params.append(allowed_towns)
+            statement = self.BEST_PREDICTS[(bool(allowed_types), bool(allowed_towns))]
         async with self._db_pool.acquire() as conn:
             conn: Connection
-            rows = await conn.fetch(
-                sql_template, 
-                user_id, 
-                disallowed_places, 
-                allowed_types, 
-                allowed_towns, 
-                n_places
-            )
+            rows = await conn.fetch(STATEMENTS.sql(statement), *params)
             return [row["place_id"] for row in rows]
-        return []
\ No newline at end of file
+        return []
+
+    @timed("users.recommend")
+    async def recommend(self,
+                        user_id: str,
+                        n_places: int,
+                        allowed_types: list[str],
+                        allowed_towns: list[str],
+                        after: tuple[float, int] | None = None
+                       ) -> list[dict[str, Any]]:
+        """
+        Лучшие по виртуальной оценке места, за которые пользователь ещё не голосовал, сразу с метаданными.
+        `after` - (score, place_id) последнего места предыдущей страницы.
+        """
+        if self._mode == "topk":
+            # Пустой список фильтра выбирает корзину без этого фильтра
+            params: list[Any] = [user_id, n_places, allowed_types or [""], allowed_towns or [""]]
+            statement = self.RECOMMEND_TOPK[(bool(allowed_types) and bool(allowed_towns), after is not None)]
+        else:
+            params = [user_id, n_places]
+            if allowed_types:
+                params.append(allowed_types)
+            if allowed_towns:
+                params.append(allowed_towns)
+            statement = self.RECOMMEND[(bool(allowed_types), bool(allowed_towns), after is not None)]
+        if after is not None:
+            params.extend(after)
+        async with self._db_pool.acquire() as conn:
+            conn: Connection
+            rows = await conn.fetch(STATEMENTS.sql(statement), *params)
+            return [dict(row) for row in rows]
+        return []
@@ -0,0 +1,202 @@
+import asyncio
+from time import monotonic
+from datetime import datetime, timedelta
+from typing import Any
+import numpy as np
+from asyncpg import Connection, Pool
+from .tracing import stage
+
+__all__ = ["PlacesCatalog", "FEATURES"]
+
+# Модуль одинаковый в api и recsys: сервисы собираются из отдельных контекстов.
+# Копии сверяет `api/tests/test_places_catalog.py`, правку одной копии нужно перенести в другую
+META_COLUMNS: list[str] = ["name", "description", "town", "type"]
+# Признаки мест: колонки таблицы `places` и признаки модели, в этом порядке
+FEATURES: list[str] = [
+    "natural_scenery",
+    "cultural_richness",
+    "adventure_level",
+    "family_friendliness",
+    "beach_quality",
+    "mountain_terrain",
+    "urban_vibrancy",
+    "food_variety",
+    "accommodation_quality",
+    "transportation_accessibility",
+    "cost_level",
+    "safety",
+    "relaxation_level",
+    "nightlife_intensity",
+    "historical_significance"
+]
+
+class PlacesCatalog:
+    """
+    Копия таблицы `places` в памяти процесса в колоночном виде:
+    идентификаторы, матрица признаков float32 и, с `metadata`, названия, описания, города и типы.
+    Обновляется инкрементально по `updated_at`; номер версии растёт при каждом изменении.
+    Признаки индексированных мест готовятся один раз на версию.
+    Удаление мест не поддерживается - приложение их не удаляет.
+    """
+    def __init__(self,
+                 db_pool: Pool,
+                 features: list[str],
+                 refresh_interval: float = 1.0,
+                 lookback: float = 10.0,
+                 metadata: bool = True
+                ) -> None:
+        self._db_pool: Pool = db_pool
+        self._features: list[str] = features
+        self._refresh_interval: float = refresh_interval
+        # Транзакции фиксируются не в порядке `updated_at`, поэтому окно перечитывается с запасом
+        self._lookback: timedelta = timedelta(seconds=lookback)
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._last_refresh: float = float("-inf")
+        self._watermark: datetime | None = None
+        self._version: int = 0
+
+        self._ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._matrix: np.ndarray = np.empty((0, len(features)), dtype=np.float32)
+        self._is_indexed: np.ndarray = np.empty(0, dtype=bool)
+        self._updated_at: list[datetime] = []
+        self._meta: dict[str, list[str]] = {column: [] for column in META_COLUMNS} if metadata else {}
+        self._rows: dict[int, int] = {}
+        self._indexed_view: tuple[int, np.ndarray, np.ndarray] | None = None
+
+        columns = ", ".join(["place_id", *self._meta, "is_indexed", "updated_at"] + features)
+        self._full_sql: str = f"""
+            SELECT {columns}
+            FROM places
+            ORDER BY updated_at;
+        """
+        self._changed_sql: str = f"""
+            SELECT {columns}
+            FROM places
+            WHERE updated_at > $1
+            ORDER BY updated_at;
+        """
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    async def refresh(self, force: bool = False) -> int:
+        async with self._lock:
+            if not force and monotonic() - self._last_refresh < self._refresh_interval:
+                return self._version
+            with stage("places_catalog.refresh"):
+                async with self._db_pool.acquire() as conn:
+                    conn: Connection
+                    if self._watermark is None:
+                        rows = await conn.fetch(self._full_sql)
+                    else:
+                        rows = await conn.fetch(self._changed_sql, self._watermark - self._lookback)
+            self._last_refresh = monotonic()
+            if rows:
+                self._apply(rows)
+            return self._version
+
+    def _apply(self, rows: list) -> None:
+        new_rows: list = []
+        changed = False
+        for row in rows:
+            idx = self._rows.get(row["place_id"])
+            if idx is None:
+                new_rows.append(row)
+                continue
+            if self._updated_at[idx] == row["updated_at"]:
+                continue
+            self._matrix[idx] = [row[field] for field in self._features]
+            self._is_indexed[idx] = row["is_indexed"]
+            self._updated_at[idx] = row["updated_at"]
+            for column, values in self._meta.items():
+                values[idx] = row[column]
+            changed = True
+
+        if new_rows:
+            offset = len(self._ids)
+            self._ids = np.concatenate([self._ids, np.fromiter((row["place_id"] for row in new_rows), dtype=np.int64, count=len(new_rows))])
+            self._matrix = np.concatenate([
+                self._matrix,
+                np.array([[row[field] for field in self._features] for row in new_rows], dtype=np.float32)
+            ])
+            self._is_indexed = np.concatenate([self._is_indexed, np.array([row["is_indexed"] for row in new_rows], dtype=bool)])
+            for i, row in enumerate(new_rows):
+                self._rows[row["place_id"]] = offset + i
+                self._updated_at.append(row["updated_at"])
+                for column, values in self._meta.items():
+                    values.append(row[column])
+            changed = True
+
+        latest = rows[-1]["updated_at"]
+        if self._watermark is None or latest > self._watermark:
+            self._watermark = latest
+        if changed:
+            self._version += 1
+
+    async def _refresh_for(self, place_ids: list[int]) -> None:
+        await self.refresh()
+        if any(place_id not in self._rows for place_id in place_ids):
+            await self.refresh(force=True)
+
+    def _meta_column(self, column: str) -> list[str]:
+        if not self._meta:
+            raise RuntimeError("Places catalog is created without metadata")
+        return self._meta[column]
+
+    async def indexed(self) -> tuple[int, np.ndarray, np.ndarray]:
+        """
+        Версия, идентификаторы индексированных мест по возрастанию и их признаки.
+        Матрица признаков общая для всех запросов одной версии, изменять её нельзя.
+        """
+        await self.refresh()
+        if self._indexed_view is None or self._indexed_view[0] != self._version:
+            rows = np.flatnonzero(self._is_indexed)
+            rows = rows[np.argsort(self._ids[rows], kind="stable")]
+            matrix = self._matrix[rows]
+            matrix.flags.writeable = False
+            self._indexed_view = (self._version, self._ids[rows], matrix)
+        return self._indexed_view
+
+    async def lookup(self, place_ids: list[int]) -> np.ndarray:
+        """Признаки мест в порядке `place_ids`, для неизвестных мест - нули."""
+        await self._refresh_for(place_ids)
+        matrix = np.zeros((len(place_ids), len(self._features)), dtype=np.float32)
+        for i, place_id in enumerate(place_ids):
+            idx = self._rows.get(place_id)
+            if idx is not None:
+                matrix[i] = self._matrix[idx]
+        return matrix
+
+    async def types_towns(self, place_ids: list[int]) -> tuple[list[str], list[str]]:
+        """Типы и города мест в порядке `place_ids`, для неизвестных мест - пустые строки."""
+        await self._refresh_for(place_ids)
+        all_types, all_towns = self._meta_column("type"), self._meta_column("town")
+        types: list[str] = []
+        towns: list[str] = []
+        for place_id in place_ids:
+            idx = self._rows.get(place_id)
+            types.append("" if idx is None else all_types[idx])
+            towns.append("" if idx is None else all_towns[idx])
+        return types, towns
+
+    async def meta(self, place_ids: list[int]) -> list[dict[str, Any]]:
+        await self._refresh_for(place_ids)
+        columns = {column: self._meta_column(column) for column in META_COLUMNS}
+        meta_list = []
+        for place_id in sorted(set(place_ids)):
+            idx = self._rows.get(place_id)
+            if idx is None:
+                continue
+            meta_list.append({"place_id": place_id, **{column: values[idx] for column, values in columns.items()}})
+        return meta_list
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "version": self._version,
+            "places": len(self._ids),
+            "indexed": int(self._is_indexed.sum())
+        }
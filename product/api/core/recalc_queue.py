@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+__all__ = ["RecalcQueue"]
+
+class RecalcQueue:
+    """
+    Фоновая очередь пересчёта виртуальных оценок.
+    Повторные запросы для пользователя, который уже ждёт в очереди, объединяются в одну задачу;
+    запрос во время выполнения задачи пользователя ставит ровно один повторный пересчёт.
+    """
+    def __init__(self, handler: Callable[[str], Awaitable[None]], n_workers: int = 2) -> None:
+        self._handler: Callable[[str], Awaitable[None]] = handler
+        self._n_workers: int = n_workers
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: set[str] = set()
+        self._running: set[str] = set()
+        self._rerun: set[str] = set()
+        self._workers: list[asyncio.Task] = []
+        self._stats: dict[str, int] = {
+            "submitted": 0,
+            "coalesced": 0,
+            "processed": 0,
+            "failed": 0
+        }
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self._n_workers)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, user_id: str) -> bool:
+        self._stats["submitted"] += 1
+        if user_id in self._pending:
+            self._stats["coalesced"] += 1
+            return False
+        if user_id in self._running:
+            self._stats["coalesced"] += 1
+            self._rerun.add(user_id)
+            return False
+        self._enqueue(user_id)
+        return True
+
+    def _enqueue(self, user_id: str) -> None:
+        self._pending.add(user_id)
+        self._queue.put_nowait(user_id)
+
+    async def _work(self) -> None:
+        while True:
+            user_id = await self._queue.get()
+            self._pending.discard(user_id)
+            self._running.add(user_id)
+            try:
+                await self._handler(user_id)
+                self._stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._stats["failed"] += 1
+            finally:
+                self._running.discard(user_id)
+                self._queue.task_done()
+                if user_id in self._rerun:
+                    self._rerun.discard(user_id)
+                    self._enqueue(user_id)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize(),
+            "running": len(self._running),
+            "workers": self._n_workers
+        }
@@ -1,3 +1,4 @@
 from .base import *
+from .matrix_payload import *
 from .llm_svc import *
-from .recsys_svc import *
\ No newline at end of file
+from .recsys_svc import *
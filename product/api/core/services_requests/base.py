@@ -1,29 +1,193 @@
-from httpx import AsyncClient, Response
-from typing import Any
+import asyncio
+import random
+from time import monotonic
+from typing import Any, ClassVar
+from httpx import AsyncClient, ConnectError, ConnectTimeout, Limits, PoolTimeout, Response, Timeout, TransportError
+from ..tracing import stage, trace_headers
 
-__all__ = ["BaseSvc"]
+__all__ = ["SvcOverloaded", "RetryBudget", "BaseSvc"]
+
+class SvcOverloaded(Exception):
+    """Сервис отказал из-за перегрузки (503 с `Retry-After`), повторять запрос сразу бессмысленно."""
+    def __init__(self, svc: str, retry_after: float) -> None:
+        super().__init__(f"`{svc}` is overloaded, retry after {retry_after:.0f}s")
+        self.retry_after: float = retry_after
+
+class RetryBudget:
+    """
+    Ограничивает долю повторных запросов: каждый запрос пополняет бюджет на `ratio`,
+    каждый повтор тратит единицу. `min_per_sec` гарантирует повторы при малой нагрузке.
+    """
+    def __init__(self, ratio: float = 0.2, min_per_sec: float = 1.0, max_tokens: float = 20.0) -> None:
+        self._ratio: float = ratio
+        self._min_per_sec: float = min_per_sec
+        self._max_tokens: float = max_tokens
+        self._tokens: float = max_tokens
+        self._last_refill: float = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self._max_tokens, self._tokens + (now - self._last_refill) * self._min_per_sec)
+        self._last_refill = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
 
 class BaseSvc:
-    def __init__(self, svc_url: str) -> None:
+    # Префикс стадий исходящих запросов в метриках
+    NAME: ClassVar[str] = "svc"
+    # Таймауты (в секундах) для отдельных эндпоинтов, остальные используют `timeout`
+    ENDPOINT_TIMEOUTS: ClassVar[dict[str, float]] = {"/ping": 5.0}
+    # Ответы, после которых повторяются только идемпотентные вызовы: 502/504 приходят и тогда,
+    # когда сервис получил запрос и, возможно, ещё его выполняет
+    RETRY_STATUSES: ClassVar[frozenset[int]] = frozenset({502, 503, 504})
+    # Ошибки, при которых запрос не дошёл до сервиса: их можно повторять для любого запроса.
+    # Остальные (таймаут чтения, разрыв соединения) повторяются только для идемпотентных вызовов -
+    # сервис мог уже выполнить дорогую работу
+    RETRY_ERRORS: ClassVar[tuple[type[TransportError], ...]] = (ConnectError, ConnectTimeout, PoolTimeout)
+
+    def __init__(self,
+                 svc_url: str,
+                 timeout: float = 10.0,
+                 connect_timeout: float = 3.0,
+                 max_connections: int = 20,
+                 max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0,
+                 max_retries: int = 2,
+                 backoff: float = 0.1,
+                 retry_budget: RetryBudget | None = None
+                ) -> None:
         self._svc_url = svc_url
-    
+        self._timeout: float = timeout
+        self._connect_timeout: float = connect_timeout
+        self._max_retries: int = max_retries
+        self._backoff: float = backoff
+        self._retry_budget: RetryBudget = retry_budget or RetryBudget()
+        self._client: AsyncClient = AsyncClient(
+            limits=Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=Timeout(timeout, connect=connect_timeout)
+        )
+        self._stats: dict[str, int] = {
+            "requests": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "failures": 0,
+            "overloaded": 0,
+            "in_flight": 0
+        }
+
     async def check_alive(self) -> bool:
         resp = await self.get("/ping")
         return resp.status_code == 200
 
+    async def close(self) -> None:
+        await self._client.aclose()
+
     @property
     def svc_url(self) -> str:
         return self._svc_url
-    
+
     def endpoint_url(self, endpoint: str) -> str:
         return f"{self.svc_url}{endpoint}"
-    
+
+    def endpoint_timeout(self, endpoint: str) -> Timeout:
+        return Timeout(self.ENDPOINT_TIMEOUTS.get(endpoint, self._timeout), connect=self._connect_timeout)
+
+    def pool_stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = dict(self._stats)
+        stats["retry_tokens"] = round(self._retry_budget.tokens, 2)
+        # httpx не даёт публичного доступа к пулу, поэтому читаем его аккуратно
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+        return stats
+
+    async def _request(self, method: str, endpoint: str, idempotent: bool | None = None, **kwargs: Any) -> Response:
+        kwargs["headers"] = {**trace_headers(), **kwargs.get("headers", {})}
+        if idempotent is None:
+            idempotent = method == "GET"
+        with stage(f"{self.NAME}.{endpoint.strip('/')}"):
+            return await self._send(method, endpoint, idempotent, **kwargs)
+
+    async def _send(self, method: str, endpoint: str, idempotent: bool, **kwargs: Any) -> Response:
+        self._retry_budget.deposit()
+        self._stats["requests"] += 1
+        self._stats["in_flight"] += 1
+        try:
+            attempt = 0
+            while True:
+                error: TransportError | None = None
+                response: Response | None = None
+                try:
+                    response = await self._client.request(
+                        method,
+                        self.endpoint_url(endpoint),
+                        timeout=self.endpoint_timeout(endpoint),
+                        **kwargs
+                    )
+                    if response.status_code not in self.RETRY_STATUSES:
+                        return response
+                    if response.status_code == 503 and "Retry-After" in response.headers:
+                        self._stats["overloaded"] += 1
+                        raise SvcOverloaded(self.NAME, float(response.headers["Retry-After"]))
+                    if not idempotent:
+                        self._stats["failures"] += 1
+                        return response
+                except TransportError as e:
+                    if not idempotent and not isinstance(e, self.RETRY_ERRORS):
+                        self._stats["failures"] += 1
+                        raise
+                    error = e
+                if attempt >= self._max_retries:
+                    self._stats["failures"] += 1
+                elif not self._retry_budget.try_withdraw():
+                    self._stats["retries_denied"] += 1
+                    self._stats["failures"] += 1
+                else:
+                    attempt += 1
+                    self._stats["retries"] += 1
+                    # Экспоненциальная задержка с полным джиттером
+                    await asyncio.sleep(random.uniform(0, self._backoff * 2 ** attempt))
+                    continue
+                if error is not None:
+                    raise error
+                return response
+        finally:
+            self._stats["in_flight"] -= 1
+
     async def get(self, endpoint: str) -> Response:
-        async with AsyncClient() as client:
-            return await client.get(self.endpoint_url(endpoint))
-        return None
-    
-    async def post(self, endpoint: str, data: dict[str, Any]) -> Response:
-        async with AsyncClient() as client:
-            return await client.post(self.endpoint_url(endpoint), json=data)
-        return None
\ No newline at end of file
+        return await self._request("GET", endpoint)
+
+    async def post(self, endpoint: str, data: dict[str, Any], idempotent: bool = False) -> Response:
+        return await self._request("POST", endpoint, idempotent, json=data)
+
+    async def post_content(self,
+                           endpoint: str,
+                           content: bytes,
+                           content_type: str,
+                           accept: str | None = None,
+                           idempotent: bool = False
+                          ) -> Response:
+        headers = {"Content-Type": content_type}
+        if accept is not None:
+            headers["Accept"] = accept
+        return await self._request("POST", endpoint, idempotent, content=content, headers=headers)
@@ -10,22 +10,53 @@ class MessagesType(Enum):
     OTHER = "other"
 
 class LLMSvc(BaseSvc):
+    NAME = "llm"
     CLASSIFY_MSG_ENDPOINT = "/classify-message"
     COMMENT_DATA_ENDPOINT = "/extract-comment-data"
     RECOMMEND_DATA_ENDPOINT = "/extract-recommendation-data"
+    ENDPOINT_TIMEOUTS = {
+        **BaseSvc.ENDPOINT_TIMEOUTS,
+        CLASSIFY_MSG_ENDPOINT: 30.0,
+        COMMENT_DATA_ENDPOINT: 60.0,
+        RECOMMEND_DATA_ENDPOINT: 30.0
+    }
+
+    def __init__(self, svc_url: str, **kwargs: Any) -> None:
+        super().__init__(svc_url, **kwargs)
+        # Расход токенов по эндпоинтам: (число ответов, сумма `total_tokens`)
+        self._usage: dict[str, tuple[int, int]] = {}
+
+    def _record_usage(self, endpoint: str, resp_data: dict[str, Any]) -> None:
+        usage = resp_data.get("usage")
+        if not isinstance(usage, dict):
+            return
+        count, tokens = self._usage.get(endpoint, (0, 0))
+        self._usage[endpoint] = (count + 1, tokens + int(usage.get("total_tokens", 0)))
+
+    def average_tokens(self, endpoint: str) -> float:
+        count, tokens = self._usage.get(endpoint, (0, 0))
+        return tokens / count if count else 0.0
+
+    def usage_stats(self) -> dict[str, float]:
+        return {endpoint: self.average_tokens(endpoint) for endpoint in self._usage}
 
     async def classify_messages(self, messages: list[dict[str, str]]) -> MessagesType:
         request = {"messages": messages}
         response = await self.post(self.CLASSIFY_MSG_ENDPOINT, request)
         resp_data: dict[str, str] = response.json()
+        self._record_usage(self.CLASSIFY_MSG_ENDPOINT, resp_data)
         return MessagesType(resp_data.get("type", "other"))
     
     async def extract_comment_data(self, messages: list[dict[str, str]]) -> dict[str, Any]:
         request = {"messages": messages}
         response = await self.post(self.COMMENT_DATA_ENDPOINT, request)
-        return response.json()
+        resp_data: dict[str, Any] = response.json()
+        self._record_usage(self.COMMENT_DATA_ENDPOINT, resp_data)
+        return resp_data
     
     async def extract_recommendation_data(self, messages: list[dict[str, str]]) -> dict[str, Any]:
         request = {"messages": messages}
         response = await self.post(self.RECOMMEND_DATA_ENDPOINT, request)
-        return response.json()
+        resp_data: dict[str, Any] = response.json()
+        self._record_usage(self.RECOMMEND_DATA_ENDPOINT, resp_data)
+        return resp_data
@@ -1,14 +1,35 @@
+import json
 from typing import Any
+import numpy as np
 from .base import BaseSvc
+from .matrix_payload import MSGPACK_CONTENT_TYPE, encode_array, decode_array, pack_payload, unpack_payload
 
 __all__ = ["RecSysSvc"]
 
 class RecSysSvc(BaseSvc):
+    NAME = "recsys"
     PREDICT_SCORES_ENNDPOINT = "/predict-scores"
+    ENDPOINT_TIMEOUTS = {
+        **BaseSvc.ENDPOINT_TIMEOUTS,
+        PREDICT_SCORES_ENNDPOINT: 120.0
+    }
+    # Ответы сервиса, не принимающего msgpack: 415, либо от версии, ожидающей только JSON тело, - 422
+    # или 500, когда FastAPI не может вывести ошибку валидации с бинарным телом.
+    # Сам `/predict-scores` ошибки возвращает со статусом 200
+    BINARY_UNSUPPORTED_STATUSES = frozenset({415, 422, 500})
 
-    async def predict_scores(self, 
-                             voted_places: list[dict[str, Any]], 
-                             places_scores: list[float], 
+    def __init__(self, svc_url: str, binary: bool = True, **kwargs: Any) -> None:
+        super().__init__(svc_url, **kwargs)
+        # Сбрасывается, если сервис не принимает msgpack, дальше запросы идут в JSON
+        self._binary: bool = binary
+
+    @property
+    def binary(self) -> bool:
+        return self._binary
+
+    async def predict_scores(self,
+                             voted_places: list[dict[str, Any]],
+                             places_scores: list[float],
                              estimated_places: list[dict[str, Any]]
                             ) -> list[float]:
         if len(voted_places) != len(places_scores):
@@ -20,4 +41,66 @@ class RecSysSvc(BaseSvc):
         }
         response = await self.post(self.PREDICT_SCORES_ENNDPOINT, request)
         resp_data: dict[str, Any] = response.json()
-        return resp_data.get("estimated_scores", [])
\ No newline at end of file
+        return resp_data.get("estimated_scores", [])
+
+    async def predict_scores_matrix(self,
+                                    features: list[str],
+                                    voted_places: np.ndarray,
+                                    places_scores: np.ndarray,
+                                    estimated_places: np.ndarray
+                                   ) -> np.ndarray:
+        """
+        То же, что `predict_scores`, но места передаются матрицами признаков (колонки в порядке `features`)
+        в msgpack с float32 буферами. Если сервис не поддерживает msgpack, используется JSON.
+        """
+        if len(voted_places) != len(places_scores):
+            raise ValueError("`voted_places` and `places_scores` should have a same length.")
+        if self._binary:
+            request = {
+                "features": features,
+                "voted_places": encode_array(np.asarray(voted_places, dtype=np.float32)),
+                "places_scores": encode_array(np.asarray(places_scores, dtype=np.float32)),
+                "estimated_places": encode_array(np.asarray(estimated_places, dtype=np.float32))
+            }
+            response = await self.post_content(
+                self.PREDICT_SCORES_ENNDPOINT,
+                pack_payload(request),
+                MSGPACK_CONTENT_TYPE,
+                accept=MSGPACK_CONTENT_TYPE
+            )
+            if response.status_code not in self.BINARY_UNSUPPORTED_STATUSES:
+                if response.headers.get("content-type", "").startswith(MSGPACK_CONTENT_TYPE):
+                    resp_data: dict[str, Any] = unpack_payload(response.content)
+                    if "estimated_scores" not in resp_data:
+                        return np.empty(0, dtype=np.float32)
+                    return decode_array(resp_data["estimated_scores"])
+                return np.asarray(response.json().get("estimated_scores", []), dtype=np.float32)
+            self._binary = False
+
+        scores = await self.predict_scores(
+            [dict(zip(features, row)) for row in np.asarray(voted_places).tolist()],
+            np.asarray(places_scores).tolist(),
+            [dict(zip(features, row)) for row in np.asarray(estimated_places).tolist()]
+        )
+        return np.asarray(scores, dtype=np.float32)
+
+    async def predict_user_scores(self, user_id: str) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Оценки всех индексированных мест по каталогу recsys: голоса пользователя и признаки мест
+        сервис читает сам. Возвращает (place_ids, scores) или `None`, если сервис так не умеет.
+        При ошибке сервиса оценок нет, как и в `predict_scores`.
+        """
+        response = await self.post_content(
+            self.PREDICT_SCORES_ENNDPOINT,
+            json.dumps({"user_id": user_id}).encode(),
+            "application/json",
+            accept=MSGPACK_CONTENT_TYPE if self._binary else None
+        )
+        if response.headers.get("content-type", "").startswith(MSGPACK_CONTENT_TYPE):
+            resp_data: dict[str, Any] = unpack_payload(response.content)
+            return decode_array(resp_data["place_ids"]), decode_array(resp_data["estimated_scores"])
+        resp_data = response.json()
+        if "place_ids" not in resp_data:
+            # Ошибка сервиса или версия без оценки по каталогу
+            return None if resp_data.get("status") == "ok" else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        return np.asarray(resp_data["place_ids"], dtype=np.int64), np.asarray(resp_data["estimated_scores"], dtype=np.float32)
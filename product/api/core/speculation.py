@@ -0,0 +1,65 @@
+from collections import Counter, OrderedDict, deque
+from typing import Any
+from .services_requests import MessagesType
+
+__all__ = ["MessagesTypeHistory", "SpeculationStats"]
+
+class MessagesTypeHistory:
+    """
+    Последние типы сообщений пользователей для предсказания типа следующего запроса.
+    Без истории используется самый частый тип по всем пользователям.
+    """
+    PREDICTABLE: tuple[MessagesType, ...] = (MessagesType.COMMENT, MessagesType.RECOMMEND)
+
+    def __init__(self, depth: int = 5, max_users: int = 100000) -> None:
+        self._depth: int = depth
+        self._max_users: int = max_users
+        self._history: OrderedDict[str, deque[MessagesType]] = OrderedDict()
+        self._totals: Counter[MessagesType] = Counter({MessagesType.RECOMMEND: 1})
+
+    def record(self, user_id: str, mtype: MessagesType) -> None:
+        if mtype not in self.PREDICTABLE:
+            return
+        history = self._history.get(user_id)
+        if history is None:
+            history = deque(maxlen=self._depth)
+            self._history[user_id] = history
+            if len(self._history) > self._max_users:
+                self._history.popitem(last=False)
+        self._history.move_to_end(user_id)
+        history.append(mtype)
+        self._totals[mtype] += 1
+
+    def predict(self, user_id: str) -> MessagesType:
+        history = self._history.get(user_id)
+        if not history:
+            return self._totals.most_common(1)[0][0]
+        counts = Counter(history)
+        # При равенстве побеждает тип последнего сообщения
+        return max(self.PREDICTABLE, key=lambda mtype: (counts[mtype], history[-1] == mtype))
+
+class SpeculationStats:
+    """Выигрыш по задержке и дополнительный расход токенов спекулятивного извлечения."""
+    def __init__(self) -> None:
+        self._hits: int = 0
+        self._misses: int = 0
+        self._saved_seconds: float = 0.0
+        self._extra_tokens: float = 0.0
+
+    def hit(self, saved_seconds: float) -> None:
+        self._hits += 1
+        self._saved_seconds += saved_seconds
+
+    def miss(self, extra_tokens: float) -> None:
+        self._misses += 1
+        self._extra_tokens += extra_tokens
+
+    def stats(self) -> dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0,
+            "saved_ms_per_request": self._saved_seconds * 1000 / total if total else 0.0,
+            "extra_tokens_per_request": self._extra_tokens / total if total else 0.0
+        }
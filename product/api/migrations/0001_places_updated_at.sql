@@ -0,0 +1,16 @@
+-- Колонка `updated_at` для инкрементального обновления каталога мест (для баз, созданных до её появления в init.sql)
+ALTER TABLE places ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp();
+
+CREATE INDEX IF NOT EXISTS places_updated_at_idx ON places (updated_at);
+
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS places_touch_updated_at ON places;
+CREATE TRIGGER places_touch_updated_at
+BEFORE UPDATE ON places
+FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
@@ -0,0 +1,11 @@
+-- Лучшие оценки пользователя читаются по индексу в порядке `ORDER BY score DESC, place_id` без сортировки
+CREATE INDEX IF NOT EXISTS virtual_scores_user_score_idx ON virtual_scores (user_id, score DESC, place_id);
+
+-- Каталог индексированных мест
+CREATE INDEX IF NOT EXISTS places_indexed_idx ON places (place_id) INCLUDE (type) WHERE is_indexed;
+
+-- Фильтры рекомендаций по типу и городу
+CREATE INDEX IF NOT EXISTS places_type_town_idx ON places (type, town);
+
+ANALYZE places;
+ANALYZE virtual_scores;
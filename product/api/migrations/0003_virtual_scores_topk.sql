@@ -0,0 +1,14 @@
+-- Лучшие виртуальные оценки пользователя в режиме `VIRTUAL_SCORES_MODE=topk`:
+-- по строке на корзину, места упорядочены по убыванию оценки.
+-- Пустые `bucket_type`/`bucket_town` означают корзину без фильтра по типу/городу,
+-- `complete` - в корзине все места, а не только лучшие
+CREATE TABLE IF NOT EXISTS virtual_scores_topk (
+    user_id VARCHAR(100) NOT NULL,
+    bucket_type VARCHAR(255) NOT NULL DEFAULT '',
+    bucket_town VARCHAR(255) NOT NULL DEFAULT '',
+    complete BOOLEAN NOT NULL DEFAULT FALSE,
+    place_ids BIGINT[] NOT NULL,
+    scores REAL[] NOT NULL,
+
+    PRIMARY KEY (user_id, bucket_type, bucket_town)
+);
@@ -0,0 +1,35 @@
+-- `virtual_scores` секционируется по хешу `user_id`: пересчёт пользователя затрагивает одну секцию,
+-- мёртвые строки и индексы делятся между секциями, и автоочистка обрабатывает их по отдельности.
+-- Суррогатный `vote_id` не используется и в секционированной таблице не может быть первичным ключом
+ALTER TABLE virtual_scores RENAME TO virtual_scores_unpartitioned;
+ALTER TABLE virtual_scores_unpartitioned RENAME CONSTRAINT unique_user_place_virtuals TO unique_user_place_virtuals_unpartitioned;
+DROP INDEX IF EXISTS virtual_scores_user_score_idx;
+
+CREATE TABLE virtual_scores (
+    user_id VARCHAR(100) NOT NULL,
+    place_id BIGINT NOT NULL,
+    score FLOAT NOT NULL,
+
+    CONSTRAINT unique_user_place_virtuals UNIQUE (user_id, place_id)
+) PARTITION BY HASH (user_id);
+
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE virtual_scores_p%s PARTITION OF virtual_scores FOR VALUES WITH (MODULUS 16, REMAINDER %s);',
+            i, i
+        );
+    END LOOP;
+END;
+$$;
+
+INSERT INTO virtual_scores (user_id, place_id, score)
+SELECT user_id, place_id, score
+FROM virtual_scores_unpartitioned;
+
+DROP TABLE virtual_scores_unpartitioned;
+
+CREATE INDEX virtual_scores_user_score_idx ON virtual_scores (user_id, score DESC, place_id);
+
+ANALYZE virtual_scores;
@@ -0,0 +1,10 @@
+-- Состояние виртуальных оценок одной строкой. `mode` - режим хранения api (`VIRTUAL_SCORES_MODE`),
+-- его читают задачи вне api. `generation` растёт после массового пересчёта оценок, и api сбрасывает кэш рекомендаций
+CREATE TABLE IF NOT EXISTS virtual_scores_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    mode VARCHAR(16) NOT NULL DEFAULT 'full',
+    generation BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO virtual_scores_state DEFAULT VALUES
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,51 @@
+import unittest
+from httpx import AsyncClient, MockTransport, Request, Response
+from core.services_requests.base import BaseSvc, SvcOverloaded
+
+class BaseSvcRetryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.svc = BaseSvc("http://svc", backoff=0.0)
+        self.statuses: list[int] = []
+        self.requests: list[Request] = []
+
+        def handle(request: Request) -> Response:
+            self.requests.append(request)
+            status = self.statuses.pop(0) if self.statuses else 200
+            headers = {"Retry-After": "5"} if status == 503 else {}
+            return Response(status, headers=headers, json={"status": "ok"})
+
+        await self.svc.close()
+        self.svc._client = AsyncClient(transport=MockTransport(handle))
+
+    async def asyncTearDown(self) -> None:
+        await self.svc.close()
+
+    async def test_post_is_not_resent_after_502_or_504(self) -> None:
+        for status in (502, 504):
+            self.requests.clear()
+            self.statuses = [status]
+            response = await self.svc.post("/predict-scores", {"user_id": "u"})
+            self.assertEqual(response.status_code, status)
+            self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.svc.pool_stats()["retries"], 0)
+
+    async def test_idempotent_post_is_retried_after_502(self) -> None:
+        self.statuses = [502, 504]
+        response = await self.svc.post("/predict-scores", {"user_id": "u"}, idempotent=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_get_is_retried_after_502(self) -> None:
+        self.statuses = [502]
+        response = await self.svc.get("/ping")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_overloaded_is_not_retried(self) -> None:
+        self.statuses = [503]
+        with self.assertRaises(SvcOverloaded):
+            await self.svc.get("/ping")
+        self.assertEqual(len(self.requests), 1)
+
+if __name__ == "__main__":
+    unittest.main()
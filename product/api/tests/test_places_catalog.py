@@ -0,0 +1,18 @@
+import unittest
+from pathlib import Path
+
+API_CATALOG: Path = Path(__file__).parents[1] / "core" / "places_catalog.py"
+RECSYS_CATALOG: Path = Path(__file__).parents[2] / "recsys" / "core" / "places_catalog.py"
+
+class PlacesCatalogCopiesTest(unittest.TestCase):
+    @unittest.skipUnless(RECSYS_CATALOG.exists(), "recsys sources are not next to api")
+    def test_api_and_recsys_copies_are_identical(self) -> None:
+        # api и recsys собираются из отдельных контекстов Docker, поэтому модуль лежит в обоих копией
+        self.assertEqual(
+            API_CATALOG.read_bytes(),
+            RECSYS_CATALOG.read_bytes(),
+            "api/core/places_catalog.py and recsys/core/places_catalog.py differ, copy the changed one over the other"
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Отзывчивость recsys под нагрузкой предсказаниями и обучением.
+`--clients` клиентов без пауз запрашивают оценки всего каталога для случайных пользователей,
+с `--train` в начале запускается полное обучение. Отдельный клиент каждые `--probe-interval` секунд
+запрашивает `/ping`: его задержка показывает, насколько занят цикл событий.
+
+    python bench_event_loop.py --dsn $DATABASE_URL --url http://localhost:8002 --clients 8 --duration 20 --train
+"""
+import os
+import random
+import asyncio
+import argparse
+from time import perf_counter
+from typing import Any
+import httpx
+import numpy as np
+from asyncpg import connect
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return "-"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return f"p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  p99 {p99:7.1f}ms  max {max(values) * 1000:7.1f}ms"
+
+async def probe(client: httpx.AsyncClient, deadline: float, interval: float, latencies: list[float]) -> None:
+    while perf_counter() < deadline:
+        start = perf_counter()
+        await client.get("/ping")
+        latencies.append(perf_counter() - start)
+        await asyncio.sleep(interval)
+
+async def predictor(client: httpx.AsyncClient, deadline: float, users: list[str], latencies: list[float]) -> None:
+    while perf_counter() < deadline:
+        start = perf_counter()
+        response = await client.post("/predict-scores", json={"user_id": random.choice(users)})
+        if response.json().get("status") == "ok":
+            latencies.append(perf_counter() - start)
+
+async def train(client: httpx.AsyncClient, result: dict[str, Any]) -> None:
+    start = perf_counter()
+    response = await client.post("/train", json={"full": True})
+    result.update(response.json(), seconds=perf_counter() - start)
+
+async def main(args: argparse.Namespace) -> None:
+    conn = await connect(args.dsn)
+    try:
+        users = [row["user_id"] for row in await conn.fetch("SELECT DISTINCT user_id FROM votes LIMIT 1000;")]
+    finally:
+        await conn.close()
+    async with httpx.AsyncClient(base_url=args.url, timeout=600) as client:
+        ping: list[float] = []
+        predicts: list[float] = []
+        training: dict[str, Any] = {}
+        deadline = perf_counter() + args.duration
+        tasks = [probe(client, deadline, args.probe_interval, ping)]
+        tasks += [predictor(client, deadline, users, predicts) for _ in range(args.clients)]
+        if args.train:
+            tasks.append(train(client, training))
+        await asyncio.gather(*tasks)
+        stats = (await client.get("/stats")).json()
+    print(f"ping     {len(ping):5} requests  {percentiles(ping)}")
+    print(f"predict  {len(predicts):5} requests  {percentiles(predicts)}  {len(predicts) / args.duration:.1f} rps")
+    if training:
+        print(f"train    {training.get('status')} in {training['seconds']:.1f}s")
+    if "executors" in stats:
+        print(f"executors {stats['executors']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--train", action="store_true", help="start a full training at the beginning")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Подготовка признаков для `/predict-scores`: NumPy (`core/features.py`) против прежнего пути через pandas.
+Признаки мест случайные, у пользователя `--voted` оцененных мест. Для каждого числа мест сравниваются
+время на JSON-входе (списки словарей) и на матричном входе (каталог, msgpack), а также совпадение матриц.
+С `--model` сравниваются и предсказания модели.
+
+    python bench_features.py --sizes 1000 10000 100000 --model /models/model.cbm
+"""
+import sys
+import argparse
+from time import perf_counter
+from pathlib import Path
+from typing import Any, Callable
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parents[1] / "recsys"))
+
+from core.places_catalog import FEATURES
+from core.features import feature_columns, places_matrix, voted_matrix, user_profile, feature_matrix
+
+# Прежняя реализация из `recsys/app.py`
+def pandas_profile(voted_places: list[dict[str, Any]] | np.ndarray, places_scores: Any) -> dict[str, Any]:
+    if len(voted_places) == 0 or len(places_scores) == 0:
+        profile: dict[str, Any] = {"u_mean_rating": 0.5, "u_std_rating": 0.0, "u_cnt": 0}
+        for f in FEATURES:
+            profile[f"u_mean_{f}"] = 0.0
+        return profile
+    if isinstance(voted_places, np.ndarray):
+        df = pd.DataFrame(voted_places, columns=FEATURES, copy=False)
+    else:
+        df = pd.DataFrame([{f: place.get("place", place).get(f, 0.0) for f in FEATURES} for place in voted_places])
+    df["rating"] = places_scores
+    u_std_rating = df["rating"].std()
+    profile = {
+        "u_mean_rating": float(df["rating"].mean()),
+        "u_std_rating": 0.0 if pd.isna(u_std_rating) else float(u_std_rating),
+        "u_cnt": len(df)
+    }
+    for f in FEATURES:
+        profile[f"u_mean_{f}"] = float(df[f].mean())
+    return profile
+
+def pandas_features(estimated_places: list[dict[str, Any]] | pd.DataFrame, profile: dict[str, Any]) -> pd.DataFrame:
+    df = pd.DataFrame(estimated_places)
+    for key, value in profile.items():
+        df[key] = value
+    for f in FEATURES:
+        if f in df.columns:
+            df[f"diff_{f}"] = (df[f].astype(float) - df[f"u_mean_{f}"].astype(float)).abs()
+        else:
+            df[f] = 0.0
+            df[f"diff_{f}"] = 0.0
+    return df[feature_columns(FEATURES)]
+
+def best_of(func: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        best = min(best, perf_counter() - start)
+    return best, result
+
+def main(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(args.seed)
+    model = None
+    if args.model:
+        from catboost import CatBoostRegressor
+        model = CatBoostRegressor()
+        model.load_model(args.model)
+
+    voted = rng.random((args.voted, len(FEATURES)), dtype=np.float32)
+    scores = rng.random(args.voted, dtype=np.float32)
+    voted_json = [dict(zip(FEATURES, map(float, row))) for row in voted]
+    print(f"{'places':>8} {'input':>6} {'pandas':>10} {'numpy':>10} {'speedup':>8} {'max |diff|':>11} {'max |pred diff|':>16}")
+    for size in args.sizes:
+        places = rng.random((size, len(FEATURES)), dtype=np.float32)
+        places_json = [{"type": "park", **dict(zip(FEATURES, map(float, row)))} for row in places]
+        frame = pd.DataFrame(places.astype(float), columns=FEATURES)
+        cases = {
+            "json": (
+                lambda: pandas_features(places_json, pandas_profile(voted_json, scores.tolist())),
+                lambda: feature_matrix(*places_matrix(places_json, FEATURES)[:1], user_profile(voted_matrix(voted_json, FEATURES), scores))
+            ),
+            "matrix": (
+                lambda: pandas_features(frame, pandas_profile(voted, scores)),
+                lambda: feature_matrix(places, user_profile(voted, scores))
+            )
+        }
+        for name, (legacy, engine) in cases.items():
+            legacy_seconds, legacy_df = best_of(legacy, args.repeat)
+            engine_seconds, matrix = best_of(engine, args.repeat)
+            assert list(legacy_df.columns) == feature_columns(FEATURES)
+            max_diff = float(np.abs(legacy_df.to_numpy(dtype=np.float64) - matrix).max())
+            pred_diff = "-"
+            if model is not None:
+                pred_diff = f"{np.abs(model.predict(legacy_df) - model.predict(matrix)).max():.2e}"
+            print(
+                f"{size:>8} {name:>6} {legacy_seconds * 1000:>8.2f}ms {engine_seconds * 1000:>8.2f}ms "
+                f"{legacy_seconds / engine_seconds:>7.1f}x {max_diff:>11.2e} {pred_diff:>16}"
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="candidate places")
+    parser.add_argument("--voted", type=int, default=20, help="places rated by the user")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", help="CatBoost model to compare predictions")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+"""
+Отбор кандидатов KD-деревом (`RETRIEVAL_TOP_M`) против оценки моделью всего каталога.
+Для `--users` пользователей с голосами считаются оценки всех индексированных мест, затем для каждого M -
+recall@K: доля лучших K мест полной оценки, попавших в M кандидатов (двухэтапный топ-K совпадает с полным
+ровно на эти места). Места, за которые пользователь голосовал, не входят ни в кандидаты, ни в топ-K полной оценки.
+Для сравнения - recall M случайных мест (M / число мест) и время на пользователя.
+Заодно проверяется, что кандидатов у каждого пользователя ровно M, если в каталоге хватает мест без его голосов.
+
+    python bench_retrieval.py --dsn $DATABASE_URL --model /models/model.cbm --top-m 100 250 500 1000
+"""
+import os
+import sys
+import asyncio
+import argparse
+from time import perf_counter
+from pathlib import Path
+import numpy as np
+from asyncpg import create_pool
+from catboost import CatBoostRegressor
+
+sys.path.append(str(Path(__file__).parents[1] / "recsys"))
+
+from core.places_catalog import FEATURES
+from core.places_catalog import PlacesCatalog
+from core.features import feature_matrix
+from core.retrieval import CandidateIndex, catalog_rows
+from core.batch_scoring import load_users_votes, user_profiles, UserScorer
+
+USERS_SQL: str = """
+    SELECT DISTINCT user_id
+    FROM votes
+    ORDER BY user_id
+    LIMIT $1;
+"""
+
+def recall(full_scores: np.ndarray, candidates: list[np.ndarray], k: int) -> float:
+    top = np.argsort(-full_scores, axis=1, kind="stable")[:, :k]
+    hits = [np.isin(top[i], candidates[i]).sum() for i in range(len(top))]
+    return float(np.mean(hits) / k)
+
+async def main(args: argparse.Namespace) -> None:
+    model = CatBoostRegressor()
+    model.load_model(args.model)
+    pool = await create_pool(dsn=args.dsn, min_size=1, max_size=2)
+    try:
+        _, place_ids, places = await PlacesCatalog(pool, FEATURES, metadata=False).indexed()
+        async with pool.acquire() as conn:
+            user_ids = [row["user_id"] for row in await conn.fetch(USERS_SQL, args.users)]
+            votes = await load_users_votes(conn, user_ids, FEATURES)
+    finally:
+        await pool.close()
+    profiles = user_profiles(votes, user_ids)
+    start = perf_counter()
+    full_scores = UserScorer(model, places, thread_count=1).score(profiles)
+    full_ms = (perf_counter() - start) / len(user_ids) * 1000
+    voted_rows = [catalog_rows(place_ids, votes[user_id][2]) for user_id in user_ids]
+    for i, rows in enumerate(voted_rows):
+        full_scores[i, rows] = -np.inf
+    index = CandidateIndex(0, places)
+    print(f"{len(user_ids)} users, {len(place_ids)} places; full scoring {full_ms:.2f}ms per user")
+    print(f"{'M':>6} " + " ".join(f"{f'recall@{k}':>10} {f'random@{k}':>10}" for k in args.k) + f" {'per user':>10}")
+    for m in args.top_m:
+        start = perf_counter()
+        candidates = index.query(profiles, m, voted_rows)
+        # Второй этап как в `/predict-scores`: признаки и модель только для кандидатов пользователя
+        for profile, rows in zip(profiles, candidates):
+            model.predict(feature_matrix(places[rows], profile), thread_count=1)
+        per_user_ms = (perf_counter() - start) / len(user_ids) * 1000
+        for rows, voted in zip(candidates, voted_rows):
+            assert len(rows) == min(m, len(place_ids) - len(voted)), "retrieval returned fewer candidates than it could"
+            assert not np.isin(rows, voted).any(), "retrieval returned a voted place"
+        columns = " ".join(f"{recall(full_scores, candidates, k):>10.3f} {min(1.0, m / len(place_ids)):>10.3f}" for k in args.k)
+        print(f"{m:>6} {columns} {per_user_ms:>8.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "/models/model.cbm"))
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--top-m", type=int, nargs="+", default=[100, 250, 500, 1000, 2000])
+    parser.add_argument("--k", type=int, nargs="+", default=[20, 100], help="top-K of full scoring to recall")
+    asyncio.run(main(parser.parse_args()))
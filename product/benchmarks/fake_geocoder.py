@@ -0,0 +1,43 @@
+"""
+Заглушка Nominatim (`/search`) для нагрузочных тестов: координаты детерминированно
+выводятся из строки запроса (`synthetic.location`). Задержка ответа - `latency` секунд.
+
+    python fake_geocoder.py --port 9002 --latency 0.05
+    NOMINATIM_DOMAIN=localhost:9002 NOMINATIM_SCHEME=http ...
+"""
+import random
+import asyncio
+import argparse
+from typing import Any
+import uvicorn
+from fastapi import FastAPI
+
+from synthetic import location
+
+app: FastAPI = FastAPI()
+latency: float = 0.0
+jitter: float = 0.0
+
+@app.get("/search")
+async def search(q: str = "", limit: int = 1) -> list[dict[str, Any]]:
+    await asyncio.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)))
+    if not q.strip():
+        return []
+    lat, lon = location(q)
+    return [{
+        "place_id": abs(hash(q)) % 10 ** 9,
+        "lat": f"{lat:.6f}",
+        "lon": f"{lon:.6f}",
+        "display_name": q,
+        "boundingbox": [f"{lat - 0.01:.6f}", f"{lat + 0.01:.6f}", f"{lon - 0.01:.6f}", f"{lon + 0.01:.6f}"]
+    }][:limit]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9002)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response delay, seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="uniform delay spread, seconds")
+    args = parser.parse_args()
+    latency, jitter = args.latency, args.jitter
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,112 @@
+"""
+Заглушка OpenAI-совместимого API (`/v1/chat/completions`) для нагрузочных тестов без LLM провайдера.
+Тип запроса определяется по системной инструкции LLM сервиса, ответ строится по шаблонам
+сообщений из `synthetic.py`. Задержка каждого ответа - `latency` ± `jitter` секунд.
+
+    python fake_openai.py --port 9001 --latency 0.3 --jitter 0.1
+    LLM_BASE_URL=http://localhost:9001/v1 LLM_API_KEY=fake ...
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Any
+import uvicorn
+from fastapi import FastAPI
+
+from synthetic import TYPES, COMMENT_PATTERN, RECOMMEND_PATTERN, location_query, place_features
+
+app: FastAPI = FastAPI()
+latency: float = 0.0
+jitter: float = 0.0
+stats: dict[str, int] = {}
+
+def last_user_message(messages: list[dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return str(message.get("content", ""))
+    return ""
+
+def classify(text: str) -> str:
+    if COMMENT_PATTERN.search(text):
+        return "comment"
+    if RECOMMEND_PATTERN.search(text):
+        return "recommend"
+    return "other"
+
+def extract_features(text: str) -> str:
+    match = COMMENT_PATTERN.search(text)
+    if match is None:
+        return json.dumps({"name": "", "description": "", "town": "", "place_type": TYPES[0], "score": 0.5, "features": {}})
+    return json.dumps({
+        "name": match["name"],
+        "description": f"Synthetic review of {match['name']}",
+        "town": match["town"],
+        "place_type": match["place_type"],
+        "score": int(match["rating"]) / 10,
+        "features": place_features(match["name"], match["town"])
+    })
+
+def extract_location(text: str) -> str:
+    match = COMMENT_PATTERN.search(text)
+    return "unknown" if match is None else location_query(match["name"], match["town"])
+
+def extract_recommendation(text: str) -> str:
+    match = RECOMMEND_PATTERN.search(text)
+    if match is None:
+        return json.dumps({"allowed_towns": [], "allowed_types": []})
+    return json.dumps({"allowed_towns": [match["town"]], "allowed_types": [match["place_type"]]})
+
+def answer(messages: list[dict[str, Any]]) -> tuple[str, str]:
+    instruction = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+    text = last_user_message(messages)
+    if "select type of the user request" in instruction:
+        return "classify", classify(text)
+    if "Feature Scores" in instruction:
+        return "features", extract_features(text)
+    if "geographic location" in instruction:
+        return "location", extract_location(text)
+    if "Allowed Towns" in instruction:
+        return "recommendation", extract_recommendation(text)
+    return "unknown", "other"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: dict[str, Any]) -> dict[str, Any]:
+    messages: list[dict[str, Any]] = request.get("messages", [])
+    kind, content = answer(messages)
+    stats[kind] = stats.get(kind, 0) + 1
+    await asyncio.sleep(max(0.0, random.uniform(latency - jitter, latency + jitter)))
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+@app.get("/stats")
+async def get_stats() -> dict[str, int]:
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.3, help="mean response delay, seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="uniform delay spread, seconds")
+    args = parser.parse_args()
+    latency, jitter = args.latency, args.jitter
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
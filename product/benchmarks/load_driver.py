@@ -0,0 +1,168 @@
+"""
+Нагрузочный драйвер `/process-messages`: смесь комментариев, запросов рекомендаций
+(с переходом на следующую страницу) и прочих сообщений от пользователей из `gen_data.py`.
+Печатает p50/p95/p99 и запросы в секунду по каждому виду запросов.
+С `--baseline` сравнивает p95 с сохранённым через `--output` прогоном и завершается с кодом 1 при регрессии.
+
+    python load_driver.py --url http://localhost:8000 --concurrency 32 --duration 60 --output run.json
+"""
+import sys
+import json
+import random
+import asyncio
+import argparse
+from time import perf_counter
+from typing import Any
+from httpx import AsyncClient, Limits, Timeout
+
+from synthetic import COMMENT_TEMPLATE, RECOMMEND_TEMPLATE, OTHER_MESSAGES, town_name, place_name, place_type, user_id
+
+KINDS: list[str] = ["comment", "recommend", "other"]
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {kind: 0.0 for kind in KINDS}
+    for part in mix.split(","):
+        kind, weight = part.split("=")
+        if kind not in weights:
+            raise ValueError(f"Unknown kind `{kind}`, expected one of {KINDS}")
+        weights[kind] = float(weight)
+    return weights
+
+def dialogue(kind: str, rng: random.Random, args: argparse.Namespace) -> list[dict[str, str]]:
+    history = [{"role": "user", "content": rng.choice(OTHER_MESSAGES)}, {"role": "bot", "content": "How can I help you?"}]
+    messages = history[:rng.choice([0, 2])]
+    town_idx = rng.randrange(args.towns)
+    if kind == "comment":
+        idx = rng.randrange(args.places_per_town)
+        content = COMMENT_TEMPLATE.format(
+            name=place_name(town_idx, idx),
+            town=town_name(town_idx),
+            place_type=place_type(town_idx, idx),
+            rating=rng.randint(1, 10)
+        )
+    elif kind == "recommend":
+        content = RECOMMEND_TEMPLATE.format(place_type=place_type(town_idx, rng.randrange(args.places_per_town)), town=town_name(town_idx))
+    else:
+        content = rng.choice(OTHER_MESSAGES)
+    messages.append({"role": "user", "content": content})
+    return messages
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def record(self, name: str, latency: float, ok: bool) -> None:
+        self.latencies.setdefault(name, []).append(latency)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed: float) -> dict[str, dict[str, float]]:
+        result: dict[str, dict[str, float]] = {}
+        everything = [latency for values in self.latencies.values() for latency in values]
+        for name, values in sorted(self.latencies.items()) + [("total", everything)]:
+            if not values:
+                continue
+            errors = self.errors.get(name, 0) if name != "total" else sum(self.errors.values())
+            result[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "rps": len(values) / elapsed,
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99)
+            }
+        return result
+
+async def post(client: AsyncClient, recorder: Recorder, name: str, endpoint: str, body: dict[str, Any]) -> dict[str, Any]:
+    start = perf_counter()
+    try:
+        response = await client.post(endpoint, json=body)
+        data = response.json() if response.status_code == 200 else {}
+    except Exception:
+        data = {}
+    # Для `other` сервис отвечает ошибкой "Not enought information provided", это ожидаемо
+    ok = data.get("status") == "ok" or (name.endswith("other") and "error" in data)
+    recorder.record(name, perf_counter() - start, ok)
+    return data
+
+async def worker(client: AsyncClient, recorder: Recorder, args: argparse.Namespace, weights: dict[str, float], deadline: float, seed: int) -> None:
+    rng = random.Random(seed)
+    while perf_counter() < deadline:
+        kind = rng.choices(KINDS, weights=[weights[kind] for kind in KINDS])[0]
+        uid = user_id(rng.randrange(args.users))
+        messages = dialogue(kind, rng, args)
+        data = await post(client, recorder, f"process-messages:{kind}", "/process-messages", {"user_id": uid, "messages": messages})
+        if kind == "recommend" and data.get("next_cursor") and rng.random() < args.next_page:
+            await post(client, recorder, "process-messages:next-page", "/process-messages", {
+                "user_id": uid, "messages": messages, "cursor": data["next_cursor"]
+            })
+
+def print_report(report: dict[str, dict[str, float]]) -> None:
+    print(f"  {'endpoint':<30} {'requests':>8} {'errors':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, row in report.items():
+        print(
+            f"  {name:<30} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+            f"{row['p50'] * 1000:>7.1f}ms {row['p95'] * 1000:>7.1f}ms {row['p99'] * 1000:>7.1f}ms"
+        )
+
+def compare(report: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float) -> list[str]:
+    regressions = []
+    for name, row in report.items():
+        base = baseline.get(name)
+        if base is not None and row["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95'] * 1000:.1f}ms -> {row['p95'] * 1000:.1f}ms")
+    return regressions
+
+async def main(args: argparse.Namespace) -> int:
+    weights = parse_mix(args.mix)
+    recorder = Recorder()
+    limits = Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with AsyncClient(base_url=args.url, limits=limits, timeout=Timeout(args.timeout)) as client:
+        if args.warmup > 0:
+            await asyncio.gather(*[
+                worker(client, Recorder(), args, weights, perf_counter() + args.warmup, args.seed - i - 1)
+                for i in range(args.concurrency)
+            ])
+        start = perf_counter()
+        await asyncio.gather(*[
+            worker(client, recorder, args, weights, start + args.duration, args.seed + i)
+            for i in range(args.concurrency)
+        ])
+        elapsed = perf_counter() - start
+
+    report = recorder.report(elapsed)
+    print(f"{args.concurrency} workers, {elapsed:.1f}s, mix {args.mix}")
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60.0, help="measured run, seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured run before, seconds")
+    parser.add_argument("--mix", default="comment=0.3,recommend=0.6,other=0.1")
+    parser.add_argument("--next-page", type=float, default=0.3, help="probability to request the next recommendations page")
+    parser.add_argument("--users", type=int, default=1000, help="same as in gen_data.py")
+    parser.add_argument("--towns", type=int, default=50, help="same as in gen_data.py")
+    parser.add_argument("--places-per-town", type=int, default=100, help="same as in gen_data.py")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="save the report as JSON")
+    parser.add_argument("--baseline", help="report JSON to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    parser.add_argument("--seed", type=int, default=228)
+    sys.exit(asyncio.run(main(parser.parse_args())))
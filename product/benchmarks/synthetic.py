@@ -0,0 +1,58 @@
+"""
+Общие для генератора данных, заглушек и нагрузочного драйвера синтетические сущности:
+города, места, шаблоны сообщений и детерминированные координаты мест.
+"""
+import re
+import json
+import hashlib
+import random
+from pathlib import Path
+
+FEATURES_PATH: Path = Path(__file__).parents[1] / "llm" / "features.json"
+_features: dict = json.loads(FEATURES_PATH.read_text())
+
+FEATURES: list[str] = [key for key in _features if key != "type"]
+TYPES: list[str] = list(_features["type"]["categories"])
+
+COMMENT_TEMPLATE: str = "I visited {name} in {town}. It is a {place_type}, I would rate it {rating} out of 10."
+COMMENT_PATTERN: re.Pattern = re.compile(r"I visited (?P<name>.+?) in (?P<town>[\w ]+?)\. It is a (?P<place_type>\w+), I would rate it (?P<rating>\d+) out of 10")
+RECOMMEND_TEMPLATE: str = "Please recommend me a {place_type} in {town}."
+RECOMMEND_PATTERN: re.Pattern = re.compile(r"recommend me an? (?P<place_type>\w+) in (?P<town>[\w ]+?)\.")
+OTHER_MESSAGES: list[str] = ["Hello!", "How are you?", "What can you do?", "Thanks, bye."]
+
+def town_name(idx: int) -> str:
+    return f"Town {idx}"
+
+def place_name(town_idx: int, idx: int) -> str:
+    return f"Spot {town_idx}-{idx}"
+
+def place_type(town_idx: int, idx: int) -> str:
+    return TYPES[(town_idx * 31 + idx) % len(TYPES)]
+
+def place_features(name: str, town: str) -> dict[str, float]:
+    rng = random.Random(f"{name}|{town}")
+    return {feature: round(rng.random(), 3) for feature in FEATURES}
+
+def location(query: str) -> tuple[float, float]:
+    """Координаты заглушки геокодера для строки адреса."""
+    digest = hashlib.sha256(query.strip().lower().encode()).digest()
+    lat = int.from_bytes(digest[:4], "big") / 2 ** 32 * 180 - 90
+    lon = int.from_bytes(digest[4:8], "big") / 2 ** 32 * 360 - 180
+    return round(lat, 6), round(lon, 6)
+
+def location_query(name: str, town: str) -> str:
+    return f"{name}, {town}"
+
+def generate_location_id(lat: float, lon: float) -> int:
+    # Копия `generate_location_id` из `llm/core/nlp_processing/place_data/geopos_extractor.py`
+    lat_hash = hashlib.sha256(f"{lat:.6f}".encode()).digest()
+    lon_hash = hashlib.sha256(f"{lon:.6f}".encode()).digest()
+    id_bytes = bytes(a ^ b for a, b in zip(lat_hash[:8], lon_hash[:8]))
+    return abs(int.from_bytes(id_bytes, byteorder="big", signed=True))
+
+def place_id(name: str, town: str) -> int:
+    """Идентификатор, который LLM сервис выдаст месту при работе с заглушками."""
+    return generate_location_id(*location(location_query(name, town)))
+
+def user_id(idx: int) -> str:
+    return f"user {idx}"
@@ -2,26 +2,61 @@ import os
 import sys
 from typing import Any
 from pathlib import Path
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from openai import AsyncOpenAI
 
 sys.path.append(str(Path(__file__).parent.absolute()))
 
-from core import get_messages_type, get_recommendation_data, get_place_features, get_place_geopos_id
+from core import get_messages_type, get_recommendation_data, get_place_features, get_place_geopos_id, track_usage, install_tracing, AdmissionController, AdmittedClient, LLMOverloaded, Priority, llm_priority
 
 LLM_BASE_URL: str = os.getenv("LLM_BASE_URL")
 LLM_API_KEY: str = os.getenv("LLM_API_KEY")
-LLM_CLIENT = AsyncOpenAI(
-    base_url=LLM_BASE_URL,
-    api_key=LLM_API_KEY
+# Одновременные вызовы LLM и вызовы в секунду (0 - без ограничения), запас токенов на всплески
+LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_RATE_LIMIT: float = float(os.getenv("LLM_RATE_LIMIT", 0))
+LLM_RATE_BURST: float = float(os.getenv("LLM_RATE_BURST", LLM_MAX_CONCURRENCY))
+# Глубже очереди вызовы сразу получают 503
+LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", 128))
+# Сколько вызов может ждать слота (в секундах), рекомендации ждут меньше всех: пользователь ждёт ответа
+LLM_QUEUE_DEADLINES: dict[Priority, float] = {
+    Priority.RECOMMEND: float(os.getenv("LLM_RECOMMEND_DEADLINE", 5)),
+    Priority.CLASSIFY: float(os.getenv("LLM_CLASSIFY_DEADLINE", 10)),
+    Priority.COMMENT: float(os.getenv("LLM_COMMENT_DEADLINE", 30))
+}
+LLM_CLIENT = AdmittedClient(
+    AsyncOpenAI(
+        base_url=LLM_BASE_URL,
+        api_key=LLM_API_KEY
+    ),
+    AdmissionController(
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        rate=LLM_RATE_LIMIT,
+        burst=LLM_RATE_BURST,
+        max_queue=LLM_MAX_QUEUE,
+        deadlines=LLM_QUEUE_DEADLINES
+    )
 )
 
 app: FastAPI = FastAPI()
+install_tracing(app)
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, e: LLMOverloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "error": str(e)},
+        headers={"Retry-After": str(round(e.retry_after))}
+    )
 
 @app.get("/ping")
 async def ping() -> dict[str, str]:
     return {"service": "llm"}
 
+@app.get("/stats")
+async def stats() -> dict[str, Any]:
+    return {"admission": LLM_CLIENT.controller.stats()}
+
 # {
 #     "messages": [
 #         {
@@ -35,13 +70,17 @@ async def ping() -> dict[str, str]:
 async def classify_message(request: dict[str, Any]) -> dict[str, Any]:
     try:
         messages = request["messages"]
-        mtype = await get_messages_type(LLM_CLIENT, messages)
+        with track_usage() as usage, llm_priority(Priority.CLASSIFY):
+            mtype = await get_messages_type(LLM_CLIENT, messages)
         return {
             "status": "ok",
-            "type": mtype
+            "type": mtype,
+            "usage": usage
         }
     except KeyError as e:
         return {"status": "error", "error": f"Required key `{e}` missed"}
+    except LLMOverloaded:
+        raise
     except:
         return {"status": "error"}
 
@@ -58,13 +97,18 @@ async def classify_message(request: dict[str, Any]) -> dict[str, Any]:
 async def extract_comment_data(request: dict[str, Any]) -> dict[str, Any]:
     try:
         messages = request["messages"]
-        place_data = await get_place_features(LLM_CLIENT, messages)
-        place_id = await get_place_geopos_id(LLM_CLIENT, messages)
+        with track_usage() as usage, llm_priority(Priority.COMMENT):
+            place_data = await get_place_features(LLM_CLIENT, messages)
+            if place_data is None:
+                return {"status": "error", "error": "Can't extract place information", "usage": usage}
+            place_id = await get_place_geopos_id(LLM_CLIENT, messages)
         place_data["place_id"] = place_id
-        if place_data is None:
-            return {"status": "error", "error": "Can't extract place information"}
+        place_data["usage"] = usage
+        return place_data
     except KeyError as e:
         return {"status": "error", "error": f"Required key `{e}` missed"}
+    except LLMOverloaded:
+        raise
     except:
         return {"status": "error"}
 
@@ -81,13 +125,17 @@ async def extract_comment_data(request: dict[str, Any]) -> dict[str, Any]:
 async def extract_recommendation_data(request: dict[str, Any]) -> dict[str, Any]:
     try:
         messages = request["messages"]
-        types, towns = get_recommendation_data(LLM_CLIENT, messages)
+        with track_usage() as usage, llm_priority(Priority.RECOMMEND):
+            types, towns = await get_recommendation_data(LLM_CLIENT, messages)
         return {
             "status": "ok",
             "allowed_types": types,
-            "allowed_towns": towns
+            "allowed_towns": towns,
+            "usage": usage
         }
     except KeyError as e:
         return {"status": "error", "error": f"Required key `{e}` missed"}
+    except LLMOverloaded:
+        raise
     except:
         return {"status": "error"}
\ No newline at end of file
@@ -1 +1,4 @@
-from .nlp_processing import *
\ No newline at end of file
+from .nlp_processing import *
+from .usage import *
+from .tracing import *
+from .admission import *
\ No newline at end of file
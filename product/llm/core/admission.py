@@ -0,0 +1,206 @@
+import heapq
+import asyncio
+import itertools
+from enum import IntEnum
+from time import monotonic
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator
+from prometheus_client import Counter, Gauge, Histogram
+
+__all__ = ["Priority", "LLMOverloaded", "TokenBucket", "AdmissionController", "AdmittedClient", "llm_priority"]
+
+class Priority(IntEnum):
+    # Меньшее значение обслуживается раньше
+    RECOMMEND = 0
+    CLASSIFY = 1
+    COMMENT = 2
+
+QUEUE_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+QUEUE_WAIT_SECONDS: Histogram = Histogram("llm_queue_wait_seconds", "Wait for an LLM call slot", ["priority"], buckets=QUEUE_BUCKETS)
+SHED_TOTAL: Counter = Counter("llm_shed_total", "LLM calls rejected by admission control", ["priority", "reason"])
+QUEUE_DEPTH: Gauge = Gauge("llm_queue_depth", "LLM calls waiting for a slot")
+IN_FLIGHT: Gauge = Gauge("llm_in_flight", "LLM calls in progress")
+
+_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.CLASSIFY)
+
+@contextmanager
+def llm_priority(priority: Priority) -> Iterator[None]:
+    """Приоритет вызовов LLM внутри блока."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class LLMOverloaded(Exception):
+    """Вызов LLM отклонён: очередь переполнена (`queue_full`) или ожидание дольше срока (`deadline`)."""
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(f"LLM overloaded: {reason}")
+        self.reason: str = reason
+        self.retry_after: float = retry_after
+
+class TokenBucket:
+    """`rate` вызовов в секунду с запасом `burst`; `rate <= 0` - без ограничения."""
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate: float = rate
+        self._burst: float = max(1.0, burst)
+        self._tokens: float = self._burst
+        self._last: float = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+    def delay(self) -> float:
+        """Сколько ждать до появления токена."""
+        if self._rate <= 0:
+            return 0.0
+        self._refill()
+        return 0.0 if self._tokens >= 1.0 else (1.0 - self._tokens) / self._rate
+
+    def take(self) -> None:
+        if self._rate > 0:
+            self._tokens -= 1.0
+
+class AdmissionController:
+    """
+    Допуск вызовов LLM: не больше `max_concurrency` одновременных вызовов и `rate` вызовов в секунду.
+    Ожидающие вызовы обслуживаются по приоритету, внутри приоритета - по очереди.
+    При `max_queue` ожидающих новый вызов вытесняет ожидающий вызов с худшим приоритетом или отклоняется сам;
+    вызов, не дождавшийся слота за срок своего приоритета, тоже отклоняется.
+    """
+    def __init__(self,
+                 max_concurrency: int = 32,
+                 rate: float = 0.0,
+                 burst: float | None = None,
+                 max_queue: int = 256,
+                 deadlines: dict[Priority, float] | None = None
+                ) -> None:
+        self._max_concurrency: int = max_concurrency
+        self._bucket: TokenBucket = TokenBucket(rate, burst if burst is not None else max_concurrency)
+        self._max_queue: int = max_queue
+        self._deadlines: dict[Priority, float] = {priority: 30.0 for priority in Priority}
+        self._deadlines.update(deadlines or {})
+        self._in_flight: int = 0
+        self._waiters: list[tuple[Priority, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._stats: dict[str, int] = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_deadline": 0}
+
+    def _retry_after(self) -> float:
+        return max(1.0, min(self._deadlines.values()))
+
+    def _reject(self, priority: Priority, reason: str) -> LLMOverloaded:
+        self._stats[f"shed_{reason}"] += 1
+        SHED_TOTAL.labels(priority.name.lower(), reason).inc()
+        return LLMOverloaded(reason, self._retry_after())
+
+    def _waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters and self._in_flight < self._max_concurrency:
+            _, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._bucket.delay()
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                break
+            heapq.heappop(self._waiters)
+            self._bucket.take()
+            self._in_flight += 1
+            future.set_result(None)
+        QUEUE_DEPTH.set(self._waiting())
+        IN_FLIGHT.set(self._in_flight)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        if self._timer is None:
+            self._dispatch()
+        IN_FLIGHT.set(self._in_flight)
+
+    def _enqueue(self, priority: Priority) -> asyncio.Future:
+        if self._waiting() >= self._max_queue:
+            live = [waiter for waiter in self._waiters if not waiter[2].done()]
+            worst = max(live, key=lambda waiter: (waiter[0], waiter[1]))
+            if worst[0] <= priority:
+                raise self._reject(priority, "queue_full")
+            worst[2].set_exception(self._reject(worst[0], "queue_full"))
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._stats["queued"] += 1
+        return future
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        start = monotonic()
+        if not self._waiters and self._in_flight < self._max_concurrency and self._bucket.delay() == 0:
+            self._bucket.take()
+            self._in_flight += 1
+            IN_FLIGHT.set(self._in_flight)
+        else:
+            future = self._enqueue(priority)
+            if self._timer is None:
+                self._dispatch()
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self._deadlines[priority])
+            except asyncio.TimeoutError:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    self._release()
+                future.cancel()
+                raise self._reject(priority, "deadline") from None
+            except BaseException:
+                # Слот мог быть выдан одновременно с отменой ожидания
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    self._release()
+                future.cancel()
+                raise
+            finally:
+                QUEUE_DEPTH.set(self._waiting())
+        QUEUE_WAIT_SECONDS.labels(priority.name.lower()).observe(monotonic() - start)
+        self._stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting(),
+            "max_concurrency": self._max_concurrency,
+            "max_queue": self._max_queue
+        }
+
+class _AdmittedCompletions:
+    def __init__(self, completions: Any, controller: AdmissionController) -> None:
+        self._completions: Any = completions
+        self._controller: AdmissionController = controller
+
+    async def create(self, **kwargs: Any) -> Any:
+        async with self._controller.slot(_priority.get()):
+            return await self._completions.create(**kwargs)
+
+class _AdmittedChat:
+    def __init__(self, chat: Any, controller: AdmissionController) -> None:
+        self.completions: _AdmittedCompletions = _AdmittedCompletions(chat.completions, controller)
+
+class AdmittedClient:
+    """
+    Клиент OpenAI, у которого `chat.completions.create` проходит через `AdmissionController`
+    с приоритетом из `llm_priority`. Остальные атрибуты берутся у исходного клиента.
+    """
+    def __init__(self, client: Any, controller: AdmissionController) -> None:
+        self._client: Any = client
+        self.controller: AdmissionController = controller
+        self.chat: _AdmittedChat = _AdmittedChat(client.chat, controller)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
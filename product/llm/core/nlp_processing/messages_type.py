@@ -2,6 +2,9 @@ import os
 from typing import Any
 from copy import copy
 from openai import AsyncOpenAI
+from ..usage import record_usage
+from ..tracing import timed
+from ..admission import LLMOverloaded
 
 __all__ = ["get_messages_type"]
 
@@ -14,6 +17,7 @@ INSTRUCTION = ""\
 "Use `other` in the case when it is impossible to determine category (neither `comment` nor `recommend`). "\
 "Print EXACTLY 1 word - determined type without any quotes."
 
+@timed("get_messages_type")
 async def get_messages_type(client: AsyncOpenAI, messages: list[dict[str, Any]]) -> str:
     try:
         dialogue = copy(messages)
@@ -26,9 +30,12 @@ async def get_messages_type(client: AsyncOpenAI, messages: list[dict[str, Any]])
             messages=dialogue,
             response_format={"type": "json_object"}
         )
+        record_usage(response)
         output_text = response.choices[0].message.content
         if output_text != "comment" and output_text != "recommend":
             output_text = "other"
         return output_text
+    except LLMOverloaded:
+        raise
     except:
         return "other"
\ No newline at end of file
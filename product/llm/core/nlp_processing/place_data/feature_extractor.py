@@ -2,6 +2,9 @@ import os
 import json
 from typing import Any
 from openai import AsyncOpenAI
+from ...usage import record_usage
+from ...tracing import timed
+from ...admission import LLMOverloaded
 
 def load_features():
     with open("features.json", "r") as f:
@@ -73,6 +76,7 @@ Output: {{
 }}
 """
 
+@timed("get_place_features")
 async def get_place_features(client: AsyncOpenAI, messages: list[dict[str, str]]) -> dict[str, Any]:
     try:
         dialogue = messages.copy()
@@ -88,6 +92,7 @@ async def get_place_features(client: AsyncOpenAI, messages: list[dict[str, str]]
             temperature=0.1, 
             max_tokens=1000
         )
+        record_usage(response)
         
         output_text = response.choices[0].message.content
         extraction_result = json.loads(output_text)
@@ -124,5 +129,7 @@ async def get_place_features(client: AsyncOpenAI, messages: list[dict[str, str]]
             "score": score,
             "features": validated_features
         }
+    except LLMOverloaded:
+        raise
     except:
         return None
\ No newline at end of file
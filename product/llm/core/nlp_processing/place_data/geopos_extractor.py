@@ -2,6 +2,9 @@ import os
 import hashlib
 from random import randint
 from openai import AsyncOpenAI
+from ...usage import record_usage
+from ...tracing import stage, timed
+from ...admission import LLMOverloaded
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut
 
@@ -9,7 +12,10 @@ __all__ = ["get_place_geopos_id"]
 
 LLM_NAME = os.getenv("LLM_NAME", "gpt-4o")
 
-geolocator = Nominatim(user_agent="rest_points_recsys")
+NOMINATIM_DOMAIN = os.getenv("NOMINATIM_DOMAIN", "nominatim.openstreetmap.org")
+NOMINATIM_SCHEME = os.getenv("NOMINATIM_SCHEME", "https")
+
+geolocator = Nominatim(user_agent="rest_points_recsys", domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)
 
 def generate_location_id(lat: float, lon: float) -> int:
     lat_str = f"{lat:.6f}"
@@ -35,6 +41,7 @@ Return ONLY the location string in English, nothing else.
 If no location is mentioned make a best proposal.
 """
 
+@timed("get_place_geopos_id")
 async def get_place_geopos_id(client: AsyncOpenAI, messages: list[dict[str, str]]) -> int:
     try:
         user_messages = [msg for msg in messages if msg.get("role") == "user"]
@@ -47,23 +54,28 @@ async def get_place_geopos_id(client: AsyncOpenAI, messages: list[dict[str, str]
             temperature=0.1,
             max_tokens=100
         )
+        record_usage(response)
         
         extracted_location = response.choices[0].message.content.strip()
         if extracted_location.lower() == "unknown" or not extracted_location:
             return randint(0, 10**9)
         try:
-            location = geolocator.geocode(extracted_location, timeout=10)
+            with stage("geocode"):
+                location = geolocator.geocode(extracted_location, timeout=10)
             if location:
                 location_id = generate_location_id(location.latitude, location.longitude)
                 return location_id
         except GeocoderTimedOut:
             try:
                 simple_location = extracted_location.split(',')[0].strip()
-                location = geolocator.geocode(simple_location, timeout=5)
+                with stage("geocode"):
+                    location = geolocator.geocode(simple_location, timeout=5)
                 if location:
                     location_id = generate_location_id(location.latitude, location.longitude)
                     return location_id
             except:
                 return randint(0, 10**9)
+    except LLMOverloaded:
+        raise
     except:
         return randint(0, 10**9)
\ No newline at end of file
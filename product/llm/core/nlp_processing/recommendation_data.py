@@ -1,6 +1,9 @@
 import json
 import os
 from openai import AsyncOpenAI
+from ..usage import record_usage
+from ..tracing import timed
+from ..admission import LLMOverloaded
 
 __all__ = ["get_recommendation_data"]
 
@@ -35,6 +38,7 @@ Examples:
 - User: "Any interesting spots?" → {{"allowed_towns": [], "allowed_types": []}}
 """
 
+@timed("get_recommendation_data")
 async def get_recommendation_data(client: AsyncOpenAI, messages: list[dict[str, str]]) -> tuple[list[str], list[str]]:
     try:
         dialogue = messages.copy()
@@ -48,6 +52,7 @@ async def get_recommendation_data(client: AsyncOpenAI, messages: list[dict[str,
             response_format={"type": "json_object"},
             temperature=0.1
         )
+        record_usage(response)
         output_text = response.choices[0].message.content
         extraction_result = json.loads(output_text)
         allowed_towns = extraction_result.get("allowed_towns", [])
@@ -57,5 +62,7 @@ async def get_recommendation_data(client: AsyncOpenAI, messages: list[dict[str,
         if not isinstance(allowed_types, list):
             allowed_types = []
         return [str(town).strip() for town in allowed_types if town], [str(town).strip() for town in allowed_towns if town]
+    except LLMOverloaded:
+        raise
     except:
         return [], []
\ No newline at end of file
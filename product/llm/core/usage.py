@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+__all__ = ["track_usage", "record_usage"]
+
+_usage: ContextVar[dict[str, int] | None] = ContextVar("llm_usage", default=None)
+
+@contextmanager
+def track_usage() -> Iterator[dict[str, int]]:
+    """Суммирует расход токенов всех вызовов LLM внутри блока."""
+    usage = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0
+    }
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+def record_usage(response: Any) -> None:
+    usage = _usage.get()
+    response_usage = getattr(response, "usage", None)
+    if usage is None or response_usage is None:
+        return
+    for key in usage:
+        usage[key] += getattr(response_usage, key, 0) or 0
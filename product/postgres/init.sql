@@ -28,9 +28,23 @@ CREATE TABLE places (
     historical_significance FLOAT DEFAULT 0.00,
     
     total_votes INT DEFAULT 0,
-    is_indexed BOOLEAN DEFAULT FALSE
+    is_indexed BOOLEAN DEFAULT FALSE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
 );
 
+CREATE INDEX places_updated_at_idx ON places (updated_at);
+
+CREATE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER places_touch_updated_at
+BEFORE UPDATE ON places
+FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
 CREATE TABLE votes (
     vote_id SERIAL PRIMARY KEY,
     user_id VARCHAR(100) NOT NULL,
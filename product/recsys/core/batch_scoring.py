@@ -0,0 +1,76 @@
+import numpy as np
+from asyncpg import Connection
+from catboost import CatBoostRegressor
+from .features import user_profile, feature_matrix
+
+__all__ = ["load_users_votes", "user_profiles", "UserScorer"]
+
+async def load_users_votes(conn: Connection, user_ids: list[str], features: list[str]) -> dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Признаки мест, за которые голосовали пользователи, их оценки и id этих мест одним запросом;
+    без голосов - пустые массивы.
+    """
+    sql = f"""
+        SELECT v.user_id, v.score, p.place_id, {', '.join([f'p.{f}' for f in features])}
+        FROM votes v
+        JOIN places p ON v.place_id = p.place_id
+        WHERE v.user_id = ANY($1::text[])
+        ORDER BY v.user_id, v.vote_id;
+    """
+    rows = await conn.fetch(sql, user_ids)
+    voted_places = np.array([[row[f] for f in features] for row in rows], dtype=np.float32).reshape(len(rows), len(features))
+    places_scores = np.array([row["score"] for row in rows], dtype=np.float32)
+    voted_ids = np.array([row["place_id"] for row in rows], dtype=np.int64)
+    row_users = [row["user_id"] for row in rows]
+    votes: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    start = 0
+    # Строки упорядочены по пользователю, голоса каждого - один непрерывный отрезок
+    for end in range(1, len(rows) + 1):
+        if end == len(rows) or row_users[end] != row_users[start]:
+            votes[row_users[start]] = (voted_places[start:end], places_scores[start:end], voted_ids[start:end])
+            start = end
+    empty = (np.empty((0, len(features)), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+    return {user_id: votes.get(user_id, empty) for user_id in user_ids}
+
+def user_profiles(votes: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]], user_ids: list[str]) -> np.ndarray:
+    """Профили пользователей строками в порядке `user_ids`."""
+    return np.stack([user_profile(*votes[user_id][:2]) for user_id in user_ids]) if user_ids else np.empty((0, 0))
+
+class UserScorer:
+    """
+    Оценки мест для многих пользователей одной моделью. Признаки мест записываются в буфер один раз
+    для `block_users` пользователей подряд, для каждого пользователя меняются только `diff_*` и профиль,
+    и блок предсказывается одним вызовом. Буфер общий, поэтому один объект не используется из разных потоков.
+    """
+    def __init__(self,
+                 model: CatBoostRegressor,
+                 places: np.ndarray,
+                 thread_count: int = -1,
+                 block_rows: int = 262144
+                ) -> None:
+        self._model: CatBoostRegressor = model
+        self._places: np.ndarray = places
+        self._thread_count: int = thread_count
+        n_places, n_features = places.shape
+        self._block_users: int = max(1, block_rows // max(1, n_places))
+        self._buffer: np.ndarray = np.empty((self._block_users * n_places, 2 * n_features + 3), dtype=np.float32)
+        self._buffer[:, :n_features] = np.tile(places, (self._block_users, 1))
+
+    @property
+    def n_places(self) -> int:
+        return len(self._places)
+
+    def score(self, profiles: np.ndarray) -> np.ndarray:
+        """Матрица оценок float32: строка на профиль из `user_profiles`, колонка на место."""
+        n_places = self.n_places
+        scores = np.empty((len(profiles), n_places), dtype=np.float32)
+        if n_places == 0:
+            return scores
+        for start in range(0, len(profiles), self._block_users):
+            block = profiles[start:start + self._block_users]
+            for i, profile in enumerate(block):
+                rows = self._buffer[i * n_places:(i + 1) * n_places]
+                feature_matrix(self._places, profile, out=rows, fill_places=False)
+            predictions = self._model.predict(self._buffer[:len(block) * n_places], thread_count=self._thread_count)
+            scores[start:start + len(block)] = predictions.reshape(len(block), n_places)
+        return scores
@@ -0,0 +1,152 @@
+import struct
+import asyncio
+import numpy as np
+
+__all__ = ["BinaryCopyDecoder", "TEXT"]
+
+SIGNATURE: bytes = b"PGCOPY\n\xff\r\n\x00"
+TRAILER: bytes = b"\xff\xff"
+# Тип в потоке для текстовых колонок переменной ширины
+TEXT: str = "text"
+INT4: struct.Struct = struct.Struct(">i")
+# Разбор идёт блоками не меньше этого размера, чтобы numpy работал с большими массивами
+BATCH_BYTES: int = 1 << 20
+# Колонки растут шагами по столько строк: `ndarray.resize` заполняет добавленное нулями, и лишняя ёмкость занимает память
+GROWTH_ROWS: int = 1 << 20
+
+class BinaryCopyDecoder:
+    """
+    Разбор потока `COPY ... TO STDOUT (FORMAT binary)` по кускам в колонки numpy за один проход.
+    `columns` - имя колонки и тип в потоке: big-endian фиксированной ширины (например `>i8`, `>f8`)
+    или `text`. Текстовые колонки идут после остальных и хранятся кодами словаря, который собирается
+    из самого потока. NULL не поддерживается.
+    Число строк заранее не известно: колонки растут через `ndarray.resize`. Большие массивы лежат
+    в отдельных отображениях памяти, и realloc расширяет их без копирования и без второй копии в пике.
+    """
+    def __init__(self, columns: list[tuple[str, str]]) -> None:
+        fixed = [(name, wire_type) for name, wire_type in columns if wire_type != TEXT]
+        self._text: list[str] = [name for name, wire_type in columns if wire_type == TEXT]
+        if [name for name, _ in columns] != [name for name, _ in fixed] + self._text:
+            raise ValueError("Text columns must follow fixed-width columns")
+        self._n_fields: int = len(columns)
+        self._fixed: list[tuple[str, int]] = [(name, np.dtype(wire_type).itemsize) for name, wire_type in fixed]
+        self._dtypes: dict[str, np.dtype] = {name: np.dtype(wire_type).newbyteorder("=") for name, wire_type in fixed}
+        fields: list[tuple[str, str]] = [("n_fields", ">i2")]
+        for i, (_, wire_type) in enumerate(fixed):
+            fields += [(f"len{i}", ">i4"), (f"col{i}", wire_type)]
+        # Часть строки до текстовых колонок - запись одного размера
+        self._prefix_dtype: np.dtype = np.dtype(fields)
+        self._columns: dict[str, np.ndarray] = {name: np.empty(0, dtype=dtype) for name, dtype in self._dtypes.items()}
+        self._columns.update({name: np.empty(0, dtype=np.int32) for name in self._text})
+        self._dictionaries: dict[str, dict[bytes, int]] = {name: {} for name in self._text}
+        self._pending: bytearray = bytearray()
+        self._decoding: asyncio.Future | None = None
+        self._header_done: bool = False
+        self.rows: int = 0
+
+    async def feed(self, chunk: bytes) -> None:
+        """Обработчик `output` для `Connection.copy_from_query`."""
+        self._pending += chunk
+        if not self._header_done and not self._read_header():
+            return
+        if len(self._pending) >= BATCH_BYTES:
+            await self._submit()
+
+    async def _submit(self) -> None:
+        # Блок разбирается в потоке, пока цикл событий читает следующий. Блок начинается с неполной
+        # строки из конца предыдущего, поэтому в разборе не больше одного блока
+        tail = b"" if self._decoding is None else await self._decoding
+        batch = tail + bytes(self._pending)
+        self._pending.clear()
+        self._decoding = asyncio.get_running_loop().run_in_executor(None, self._decode, batch)
+
+    def _reserve(self, n_rows: int) -> None:
+        capacity = len(next(iter(self._columns.values())))
+        if n_rows <= capacity:
+            return
+        capacity = max(n_rows, capacity + GROWTH_ROWS)
+        for column in self._columns.values():
+            column.resize(capacity, refcheck=False)
+
+    def _read_header(self) -> bool:
+        if len(self._pending) < len(SIGNATURE) + 8:
+            return False
+        if bytes(self._pending[:len(SIGNATURE)]) != SIGNATURE:
+            raise ValueError("Not a binary COPY stream")
+        extension = int.from_bytes(self._pending[len(SIGNATURE) + 4:len(SIGNATURE) + 8], "big")
+        header_size = len(SIGNATURE) + 8 + extension
+        if len(self._pending) < header_size:
+            return False
+        del self._pending[:header_size]
+        self._header_done = True
+        return True
+
+    def _decode(self, buffer: bytes) -> bytes:
+        """Разбирает полные строки буфера и возвращает остаток; маркер конца остаётся в остатке до `finish`."""
+        size = len(buffer)
+        prefix_size = self._prefix_dtype.itemsize
+        unpack = INT4.unpack_from
+        dictionaries = [self._dictionaries[name] for name in self._text]
+        prefixes: list[bytes] = []
+        codes: list[list[int]] = [[] for _ in self._text]
+        # Границы строк зависят от длин текстов, поэтому строки разбираются последовательно
+        offset = 0
+        while True:
+            position = offset + prefix_size
+            values: list[bytes] = []
+            for _ in dictionaries:
+                if position + 4 > size:
+                    break
+                length = unpack(buffer, position)[0]
+                if length < 0:
+                    raise ValueError("Text column has NULL values")
+                position += 4
+                values.append(buffer[position:position + length])
+                position += length
+            if len(values) < len(dictionaries) or position > size:
+                break
+            prefixes.append(buffer[offset:offset + prefix_size])
+            for dictionary, column_codes, value in zip(dictionaries, codes, values):
+                column_codes.append(dictionary.setdefault(value, len(dictionary)))
+            offset = position
+        if not prefixes:
+            return buffer
+
+        # Префиксы строк одного размера - один `np.frombuffer` со структурным типом
+        prefix = np.frombuffer(b"".join(prefixes), dtype=self._prefix_dtype)
+        if (prefix["n_fields"] != self._n_fields).any():
+            raise ValueError("Unexpected number of fields in binary COPY row")
+        start, end = self.rows, self.rows + len(prefix)
+        self._reserve(end)
+        for i, (name, width) in enumerate(self._fixed):
+            if (prefix[f"len{i}"] != width).any():
+                raise ValueError(f"Column `{name}` has NULL or variable-width values")
+            self._columns[name][start:end] = prefix[f"col{i}"]
+        for name, column_codes in zip(self._text, codes):
+            self._columns[name][start:end] = column_codes
+        self.rows = end
+        return buffer[offset:]
+
+    async def finish(self) -> int:
+        """Разбирает остаток, проверяет, что поток закончился маркером конца, и возвращает число строк."""
+        if self._header_done:
+            await self._submit()
+            tail = await self._decoding
+            self._decoding = None
+        else:
+            tail = bytes(self._pending)
+        if tail != TRAILER:
+            raise ValueError("Binary COPY stream is truncated")
+        return self.rows
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Колонка целиком, после `finish`. Массив отдаётся без копирования, поэтому вызывается один раз на колонку.
+        Текстовые колонки возвращаются массивом строк.
+        """
+        column = self._columns.pop(name)
+        column.resize(self.rows, refcheck=False)
+        if name in self._dictionaries:
+            values = np.array([value.decode() for value in self._dictionaries.pop(name)], dtype=object)
+            return values[column]
+        return column
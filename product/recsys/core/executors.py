@@ -0,0 +1,67 @@
+import time
+import asyncio
+from concurrent.futures import BrokenExecutor, Executor
+from typing import Any, Callable, TypeVar
+from prometheus_client import Gauge, Histogram
+from .tracing import BUCKETS
+
+__all__ = ["TimedExecutor"]
+
+T = TypeVar("T")
+
+QUEUE_SECONDS: Histogram = Histogram("executor_queue_seconds", "Wait for an executor worker", ["executor"], buckets=BUCKETS)
+RUN_SECONDS: Histogram = Histogram("executor_run_seconds", "Task run time in an executor", ["executor"], buckets=BUCKETS)
+PENDING: Gauge = Gauge("executor_pending", "Tasks submitted to an executor and not finished", ["executor"])
+
+def _timed_call(func: Callable[..., T], args: tuple[Any, ...]) -> tuple[float, float, T]:
+    # Время по настенным часам: задача может выполняться в другом процессе
+    started = time.time()
+    result = func(*args)
+    return started, time.time(), result
+
+class TimedExecutor:
+    """
+    Пул для CPU-задач вне цикла событий с метриками времени в очереди и выполнения.
+    Пул создаётся `factory` и пересоздаётся, если его процесс упал.
+    Для пула процессов функция и аргументы должны сериализоваться pickle.
+    """
+    def __init__(self, name: str, factory: Callable[[], Executor]) -> None:
+        self._name: str = name
+        self._factory: Callable[[], Executor] = factory
+        self._executor: Executor = factory()
+        self._pending: int = 0
+        self._stats: dict[str, Any] = {"completed": 0, "failed": 0, "restarts": 0, "queue_seconds_max": 0.0}
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        submitted = time.time()
+        self._pending += 1
+        PENDING.labels(self._name).set(self._pending)
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(self._executor, _timed_call, func, args)
+        except BrokenExecutor:
+            self._stats["failed"] += 1
+            self._restart()
+            raise
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+            PENDING.labels(self._name).set(self._pending)
+        queue_seconds = max(0.0, started - submitted)
+        QUEUE_SECONDS.labels(self._name).observe(queue_seconds)
+        RUN_SECONDS.labels(self._name).observe(finished - started)
+        self._stats["completed"] += 1
+        self._stats["queue_seconds_max"] = max(self._stats["queue_seconds_max"], queue_seconds)
+        return result
+
+    def _restart(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._factory()
+        self._stats["restarts"] += 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._stats, "pending": self._pending}
@@ -0,0 +1,79 @@
+from typing import Any
+from operator import itemgetter
+import numpy as np
+
+__all__ = ["feature_columns", "places_matrix", "voted_matrix", "user_profile", "feature_matrix"]
+
+def feature_columns(features: list[str]) -> list[str]:
+    """Колонки модели: признаки места, `diff_*`, затем профиль пользователя."""
+    return features + [f"diff_{f}" for f in features] + ["u_cnt", "u_mean_rating", "u_std_rating"]
+
+def places_matrix(places: list[dict[str, Any]], features: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Матрица признаков мест из JSON и маска признаков, которые есть хотя бы у одного места.
+    Пропущенное значение - NaN, как в таблице pandas из тех же словарей.
+    """
+    try:
+        getter = itemgetter(*features)
+        matrix = np.array([getter(place) for place in places], dtype=np.float64)
+    except KeyError:
+        matrix = np.array([[place.get(f, np.nan) for f in features] for place in places], dtype=np.float64)
+    matrix = matrix.reshape(len(places), len(features))
+    keys = set().union(*places)
+    present = np.array([f in keys for f in features], dtype=bool)
+    return matrix, present
+
+def voted_matrix(voted_places: list[dict[str, Any]], features: list[str]) -> np.ndarray:
+    """Матрица признаков оцененных мест из JSON, место может быть вложено в `place`, пропуски - нули."""
+    rows = [place.get("place", place) for place in voted_places]
+    matrix = np.array([[row.get(f, 0.0) for f in features] for row in rows], dtype=np.float64)
+    return matrix.reshape(len(rows), len(features))
+
+def user_profile(voted_places: np.ndarray, places_scores: np.ndarray) -> np.ndarray:
+    """
+    Профиль пользователя вектором в порядке хвоста `feature_columns`: средние признаки оцененных мест,
+    `u_cnt`, `u_mean_rating`, `u_std_rating`. Без оценок - нули и средняя оценка 0.5.
+    Профиль в float64: `diff_*` считаются до округления во float32, как при обучении.
+    """
+    n_features = voted_places.shape[1]
+    profile = np.zeros(n_features + 3, dtype=np.float64)
+    if len(voted_places) == 0 or len(places_scores) == 0:
+        profile[n_features + 1] = 0.5
+        return profile
+    if len(voted_places) != len(places_scores):
+        raise ValueError("`voted_places` and `places_scores` should have a same length.")
+    scores = np.asarray(places_scores, dtype=np.float64)
+    profile[:n_features] = voted_places.mean(axis=0, dtype=np.float64)
+    profile[n_features] = len(scores)
+    profile[n_features + 1] = scores.mean()
+    # Несмещённая оценка, как `Series.std`; по одной оценке разброса нет
+    profile[n_features + 2] = scores.std(ddof=1) if len(scores) > 1 else 0.0
+    return profile
+
+def feature_matrix(places: np.ndarray,
+                   profile: np.ndarray,
+                   present: np.ndarray | None = None,
+                   out: np.ndarray | None = None,
+                   fill_places: bool = True
+                  ) -> np.ndarray:
+    """
+    Матрица модели float32 в порядке `feature_columns`, заполняется на месте в `out`.
+    Признаки вне маски `present` и их `diff_*` равны нулю.
+    С `fill_places=False` признаки мест в `out` уже записаны и меняется только часть пользователя.
+    """
+    n_places, n_features = places.shape
+    if out is None:
+        out = np.empty((n_places, 2 * n_features + 3), dtype=np.float32)
+    values = out[:, :n_features]
+    diffs = out[:, n_features:2 * n_features]
+    if fill_places:
+        values[...] = places
+    # Разность считается в точности `places` и профиля и только потом пишется во float32
+    np.subtract(places, profile[:n_features], out=diffs, casting="same_kind")
+    np.abs(diffs, out=diffs)
+    out[:, 2 * n_features:] = profile[n_features:]
+    if present is not None and not present.all():
+        missing = np.flatnonzero(~present)
+        values[:, missing] = 0.0
+        diffs[:, missing] = 0.0
+    return out
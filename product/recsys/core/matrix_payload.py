@@ -0,0 +1,22 @@
+from typing import Any
+import msgpack
+import numpy as np
+
+__all__ = ["MSGPACK_CONTENT_TYPE", "encode_array", "decode_array", "pack_payload", "unpack_payload"]
+
+MSGPACK_CONTENT_TYPE: str = "application/x-msgpack"
+
+def encode_array(array: np.ndarray) -> dict[str, Any]:
+    # Порядок байт фиксирован (little-endian), чтобы приёмник читал буфер без копирования
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+    return {"dtype": array.dtype.str, "shape": list(array.shape), "data": array.tobytes()}
+
+def decode_array(payload: dict[str, Any]) -> np.ndarray:
+    """Массив поверх буфера сообщения без копирования, только для чтения."""
+    return np.frombuffer(payload["data"], dtype=np.dtype(payload["dtype"])).reshape(payload["shape"])
+
+def pack_payload(payload: dict[str, Any]) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
+
+def unpack_payload(content: bytes) -> dict[str, Any]:
+    return msgpack.unpackb(content, raw=False)
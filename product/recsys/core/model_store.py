@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import threading
+from pathlib import Path
+from typing import Any
+from catboost import CatBoostRegressor
+
+__all__ = ["ModelStore"]
+
+class ModelStore:
+    """
+    Версии модели в каталоге: `model-<version>.cbm` и метаданные обучения в `model-<version>.json`.
+    Файлы пишутся во временные и переименовываются, поэтому читатели видят только целые модели.
+    Активная модель заменяется одним присваиванием: запрос, взявший модель, доработает с ней,
+    даже если в это время опубликована новая версия. `load_latest` и `publish` вызываются в пуле потоков,
+    поэтому замена идёт под блокировкой и не возвращает активную версию на более старую.
+    """
+    FILE_PATTERN: re.Pattern = re.compile(r"model-(\d+)\.cbm")
+
+    def __init__(self, model_dir: str, legacy_path: str | None = None, keep: int = 3) -> None:
+        self._model_dir: Path = Path(model_dir)
+        # Неверсионированная модель из `MODEL_PATH` загружается как версия 0, пока нет своих версий
+        self._legacy_path: Path | None = Path(legacy_path) if legacy_path else None
+        self._keep: int = keep
+        self._active: tuple[int, CatBoostRegressor, dict[str, Any]] | None = None
+        self._swaps: int = 0
+        self._swap_lock: threading.Lock = threading.Lock()
+
+    def model_path(self, version: int) -> Path:
+        return self._model_dir / f"model-{version:06d}.cbm"
+
+    def meta_path(self, version: int) -> Path:
+        return self._model_dir / f"model-{version:06d}.json"
+
+    def versions(self) -> list[int]:
+        if not self._model_dir.is_dir():
+            return []
+        versions = []
+        for path in self._model_dir.iterdir():
+            match = self.FILE_PATTERN.fullmatch(path.name)
+            if match is not None:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    @property
+    def active(self) -> tuple[int, CatBoostRegressor, dict[str, Any]] | None:
+        """Версия, модель и метаданные активной модели."""
+        return self._active
+
+    @property
+    def version(self) -> int | None:
+        active = self._active
+        return None if active is None else active[0]
+
+    @property
+    def meta(self) -> dict[str, Any]:
+        active = self._active
+        return {} if active is None else active[2]
+
+    def _load(self, model_path: Path, meta_path: Path | None) -> tuple[CatBoostRegressor, dict[str, Any]]:
+        model = CatBoostRegressor()
+        model.load_model(str(model_path))
+        meta: dict[str, Any] = {}
+        if meta_path is not None and meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+        return model, meta
+
+    def load_latest(self) -> bool:
+        """Переключается на последнюю версию на диске, если она новее активной."""
+        versions = self.versions()
+        if versions:
+            latest = versions[-1]
+            if self.version is not None and self.version >= latest:
+                return False
+            model, meta = self._load(self.model_path(latest), self.meta_path(latest))
+            return self._swap(latest, model, meta)
+        if self._active is None and self._legacy_path is not None and self._legacy_path.exists():
+            model, meta = self._load(self._legacy_path, None)
+            return self._swap(0, model, meta)
+        return False
+
+    def load_version(self, version: int) -> CatBoostRegressor | None:
+        active = self._active
+        if active is not None and active[0] == version:
+            return active[1]
+        if not self.model_path(version).exists():
+            return None
+        return self._load(self.model_path(version), None)[0]
+
+    def publish(self, model: CatBoostRegressor, meta: dict[str, Any]) -> int:
+        """Сохраняет модель новой версией и делает её активной."""
+        self._model_dir.mkdir(parents=True, exist_ok=True)
+        version = max(self.versions() + [self.version or 0]) + 1
+        # Версия без `full_version` обучена с нуля и сама служит полным обучением
+        meta = {"full_version": version, **meta, "version": version}
+        model_path, meta_path = self.model_path(version), self.meta_path(version)
+        meta_tmp = meta_path.with_suffix(".json.tmp")
+        meta_tmp.write_text(json.dumps(meta))
+        os.replace(meta_tmp, meta_path)
+        # Файл модели появляется последним: найденная по нему версия всегда с метаданными
+        model_tmp = model_path.with_suffix(".cbm.tmp")
+        model.save_model(str(model_tmp))
+        os.replace(model_tmp, model_path)
+        self._swap(version, model, meta)
+        self._prune()
+        return version
+
+    def _swap(self, version: int, model: CatBoostRegressor, meta: dict[str, Any]) -> bool:
+        with self._swap_lock:
+            if self._active is not None and self._active[0] >= version:
+                return False
+            self._active = (version, model, meta)
+            self._swaps += 1
+            return True
+
+    def _prune(self) -> None:
+        # Последнее полное обучение активной модели нужно для сравнения с ним дообученных версий
+        pinned = self.meta.get("full_version")
+        for version in self.versions()[:-self._keep]:
+            if version == pinned:
+                continue
+            self.model_path(version).unlink(missing_ok=True)
+            self.meta_path(version).unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "meta": self.meta,
+            "swaps": self._swaps,
+            "versions_on_disk": self.versions()
+        }
@@ -0,0 +1,43 @@
+import numpy as np
+from sklearn.neighbors import KDTree
+
+__all__ = ["CandidateIndex", "catalog_rows"]
+
+def catalog_rows(place_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Строки мест `ids` в отсортированном по возрастанию `place_ids`; мест вне каталога в ответе нет."""
+    ids = np.asarray(ids, dtype=np.int64)
+    rows = np.searchsorted(place_ids, ids)
+    found = rows < len(place_ids)
+    found[found] = place_ids[rows[found]] == ids[found]
+    return rows[found]
+
+class CandidateIndex:
+    """
+    Отбор кандидатов перед оценкой моделью: KD-дерево по признакам индексированных мест одной версии каталога.
+    Кандидаты пользователя - `m` мест, ближайших к средним признакам оцененных им мест (`u_mean_*` профиля).
+    """
+    def __init__(self, version: int, places: np.ndarray, leaf_size: int = 40) -> None:
+        self.version: int = version
+        self._n_places: int = len(places)
+        self._tree: KDTree | None = KDTree(places, leaf_size=leaf_size) if len(places) > 0 else None
+
+    def query(self, profiles: np.ndarray, m: int, exclude: list[np.ndarray] | None = None) -> list[np.ndarray]:
+        """
+        Строки кандидатов в матрице мест, по массиву на профиль, по возрастанию номера строки,
+        чтобы порядок мест в ответе был тем же, что и без отбора.
+        Строки `exclude[i]` (места, за которые пользователь уже голосовал) в кандидаты профиля `i` не попадают:
+        дерево ищет `m` ближайших плюс по одному на исключённое место, поэтому кандидатов ровно `m`,
+        если в каталоге хватает мест, и все оставшиеся места, если не хватает.
+        """
+        if exclude is None:
+            exclude = [np.empty(0, dtype=np.int64)] * len(profiles)
+        if self._tree is None:
+            return [np.empty(0, dtype=np.int64) for _ in profiles]
+        k = min(self._n_places, m + max((len(rows) for rows in exclude), default=0))
+        if k == self._n_places and m >= self._n_places:
+            nearest = np.tile(np.arange(self._n_places), (len(profiles), 1))
+        else:
+            n_features = self._tree.data.shape[1]
+            nearest = self._tree.query(np.asarray(profiles[:, :n_features], dtype=np.float64), k=k, return_distance=False)
+        # Строки от ближайшей к дальней: исключённые выбрасываются до отбора первых `m`
+        return [np.sort(rows[~np.isin(rows, excluded)][:m]) for rows, excluded in zip(nearest, exclude)]
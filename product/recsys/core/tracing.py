@@ -0,0 +1,90 @@
+import re
+import uuid
+from time import perf_counter
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+__all__ = ["TRACE_HEADER", "current_trace_id", "trace_headers", "stage", "timed", "install_tracing"]
+
+# Модуль одинаковый в api, llm и recsys: сервисы собираются из отдельных контекстов
+TRACE_HEADER: str = "X-Trace-Id"
+BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS: Histogram = Histogram("stage_duration_seconds", "Duration of request stages", ["stage"], buckets=BUCKETS)
+REQUEST_SECONDS: Histogram = Histogram("http_request_duration_seconds", "Duration of HTTP requests", ["method", "endpoint", "status"], buckets=BUCKETS)
+
+_trace_id: ContextVar[str | None] = ContextVar("trace_id", default=None)
+_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar("stage_timings", default=None)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+def current_trace_id() -> str | None:
+    return _trace_id.get()
+
+def trace_headers() -> dict[str, str]:
+    """Заголовки для исходящих запросов к другим сервисам."""
+    trace_id = _trace_id.get()
+    return {} if trace_id is None else {TRACE_HEADER: trace_id}
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Время блока в гистограмму `stage_duration_seconds` и в `Server-Timing` текущего запроса."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        duration = perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(duration)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, duration))
+
+def timed(name: str) -> Callable[[F], F]:
+    """Декоратор `stage` для асинхронных функций."""
+    def decorator(func: F) -> F:
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _server_timing(timings: list[tuple[str, float]], total: float) -> str:
+    # Имя метрики в `Server-Timing` - токен HTTP, повторяющиеся стадии суммируются
+    durations: dict[str, float] = {}
+    for name, duration in timings:
+        name = re.sub(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]", "_", name)
+        durations[name] = durations.get(name, 0.0) + duration
+    durations["total"] = total
+    return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in durations.items())
+
+def install_tracing(app: FastAPI) -> None:
+    """Trace id, `Server-Timing` и гистограммы для всех запросов приложения, метрики на `/metrics`."""
+    @app.middleware("http")
+    async def tracing_middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        trace_id = request.headers.get(TRACE_HEADER) or uuid.uuid4().hex
+        trace_token = _trace_id.set(trace_id)
+        timings: list[tuple[str, float]] = []
+        timings_token = _timings.set(timings)
+        start = perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _timings.reset(timings_token)
+            _trace_id.reset(trace_token)
+        total = perf_counter() - start
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        if endpoint != "/metrics":
+            REQUEST_SECONDS.labels(request.method, endpoint, str(response.status_code)).observe(total)
+        response.headers[TRACE_HEADER] = trace_id
+        response.headers["Server-Timing"] = _server_timing(timings, total)
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,152 +1,237 @@
+import asyncio
 from typing import Any
-from asyncpg import Connection, Pool
+from asyncpg import Connection, Pool, create_pool
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from catboost import CatBoostRegressor
+from .tracing import timed
+from .executors import TimedExecutor
+from .binary_copy import TEXT, BinaryCopyDecoder
+from .places_catalog import FEATURES
 
-__all__ = ["train_model"]
-
-# Фичи, используемые в модели
-FEATURES = [
-    "natural_scenery",
-    "cultural_richness",
-    "adventure_level",
-    "family_friendliness",
-    "beach_quality",
-    "mountain_terrain",
-    "urban_vibrancy",
-    "food_variety",
-    "accommodation_quality",
-    "transportation_accessibility",
-    "cost_level",
-    "safety",
-    "relaxation_level",
-    "nightlife_intensity",
-    "historical_significance"
+__all__ = ["train_model", "train_job", "load_training_data", "fit_model"]
+
+# Колонки бинарного COPY: имя, выражение и тип в потоке. Пропущенные признаки приходят как NaN,
+# как и раньше через DataFrame из записей; текстовые колонки идут последними
+TRAIN_COLUMNS: list[tuple[str, str, str]] = [
+    ("vote_id", "v.vote_id::int8", ">i8"),
+    ("rating", "v.score::float8", ">f8"),
+    ("place_id", "p.place_id::int8", ">i8")
+] + [(f, f"COALESCE(p.{f}, 'NaN')::float8", ">f8") for f in FEATURES] + [
+    ("user_id", "v.user_id", TEXT),
+    ("type", "p.type", TEXT)
 ]
+TRAIN_COLUMNS_ORDER: list[str] = ["vote_id", "user_id", "rating", "place_id", "type"] + FEATURES
 
+def _training_frame(decoder: BinaryCopyDecoder) -> pd.DataFrame:
+    """DataFrame из разобранных колонок, синхронно. Числовые колонки становятся блоками DataFrame без копирования."""
+    return pd.DataFrame({name: decoder.column(name) for name in TRAIN_COLUMNS_ORDER}, copy=False)
 
-async def train_model(db_pool: Pool, model_path: str = "/models/model.cbm", seed: int = 228) -> None:
+@timed("load_training_data")
+async def load_training_data(db_pool: Pool, after_vote_id: int | None = None) -> pd.DataFrame:
     """
-    Обучает CatBoost модель на данных из базы данных.
+    Голоса за индексированные места с признаками мест.
+    С `after_vote_id` - только голоса пользователей, у которых есть голоса новее: новые голоса
+    обучают модель, а вся история пользователя нужна для его профиля.
+    Строки читаются одним бинарным COPY и по кускам разбираются в колонки numpy, текстовые - в коды
+    словарей, собранных из того же потока: в памяти нет ни записей asyncpg, ни строк на каждый голос.
     """
-    # Получаем все данные из базы
-    sql_template = """
-        SELECT 
-            v.user_id,
-            v.score as rating,
-            p.place_id,
-            p.type,
-            p.natural_scenery,
-            p.cultural_richness,
-            p.adventure_level,
-            p.family_friendliness,
-            p.beach_quality,
-            p.mountain_terrain,
-            p.urban_vibrancy,
-            p.food_variety,
-            p.accommodation_quality,
-            p.transportation_accessibility,
-            p.cost_level,
-            p.safety,
-            p.relaxation_level,
-            p.nightlife_intensity,
-            p.historical_significance
+    condition = ""
+    args: list[Any] = []
+    if after_vote_id is not None:
+        condition = "AND v.user_id IN (SELECT user_id FROM votes WHERE vote_id > $1)"
+        args.append(after_vote_id)
+    copy_sql = f"""
+        SELECT {', '.join(expr for _, expr, _ in TRAIN_COLUMNS)}
         FROM votes v
         INNER JOIN places p ON v.place_id = p.place_id
-        WHERE p.is_indexed = TRUE
-        ORDER BY v.vote_id;
+        WHERE p.is_indexed = TRUE {condition}
+        ORDER BY v.vote_id
     """
-    
+    decoder = BinaryCopyDecoder([(name, wire_type) for name, _, wire_type in TRAIN_COLUMNS])
     async with db_pool.acquire() as conn:
         conn: Connection
-        rows = await conn.fetch(sql_template)
-    
-    if not rows:
+        await conn.copy_from_query(copy_sql, *args, output=decoder.feed, format="binary")
+    if not await decoder.finish():
         raise ValueError("No data available for training")
-    
-    data = []
-    for row in rows:
-        row_dict = dict(row)
-        data.append(row_dict)
-    
-    df = pd.DataFrame(data)
-    
-    # Проверяем наличие необходимых колонок
-    required = ["user_id", "rating"] + FEATURES
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        raise KeyError(f"Missing columns: {missing}")
-    
-    def make_split_leave1out(df: pd.DataFrame, user_col: str = "user_id", seed: int = 42) -> tuple[pd.DataFrame, pd.DataFrame]:
-        rng = np.random.default_rng(seed)
-        df = df.copy()
-        df["__is_test__"] = False
-
-        for _, g in df.groupby(user_col):
-            if len(g) <= 1:
-                continue
-            test_idx = rng.choice(g.index.to_numpy(), size=1)[0]
-            df.loc[test_idx, "__is_test__"] = True
-
-        mask = df["__is_test__"].astype(bool).to_numpy()
-        train = df.loc[~mask].drop(columns="__is_test__")
-        test = df.loc[mask].drop(columns="__is_test__")
-        return train, test
-    
-    def build_user_profile(train: pd.DataFrame, user_col: str = "user_id") -> pd.DataFrame:
-        agg = {
-            "u_mean_rating": ("rating", "mean"),
-            "u_std_rating": ("rating", "std"),
-            "u_cnt": ("rating", "size"),
-        }
-        for f in FEATURES:
-            agg[f"u_mean_{f}"] = (f, "mean")
-
-        prof = train.groupby(user_col).agg(**agg).reset_index()
-        prof["u_std_rating"] = prof["u_std_rating"].fillna(0.0)
-        return prof
-    
-    def add_features(df: pd.DataFrame, user_prof: pd.DataFrame, user_col: str = "user_id") -> pd.DataFrame:
-        out = df.merge(user_prof, on=user_col, how="left")
-
-        # Если пользователь вообще не встречался в train — заполним дефолтами
-        out["u_cnt"] = out["u_cnt"].fillna(0)
-        out["u_mean_rating"] = out["u_mean_rating"].fillna(out["rating"].mean())
-        out["u_std_rating"] = out["u_std_rating"].fillna(0.0)
-
-        for f in FEATURES:
-            out[f"u_mean_{f}"] = out[f"u_mean_{f}"].fillna(out[f].mean())
-            out[f"diff_{f}"] = (out[f].astype(float) - out[f"u_mean_{f}"].astype(float)).abs()
-
-        return out
-    
-    def get_feature_cols() -> list[str]:
-        return FEATURES + [f"diff_{f}" for f in FEATURES] + ["u_cnt", "u_mean_rating", "u_std_rating"]
-    
+    # Склейка колонок и строки пользователей - на весь набор голосов, вне цикла событий
+    return await asyncio.get_running_loop().run_in_executor(None, _training_frame, decoder)
+
+def _load_model(path: str | None) -> CatBoostRegressor | None:
+    if path is None:
+        return None
+    model = CatBoostRegressor()
+    model.load_model(path)
+    return model
+
+async def _load_training_data(dsn: str, after_vote_id: int | None) -> pd.DataFrame:
+    db_pool = await create_pool(dsn=dsn, min_size=1, max_size=1)
+    try:
+        return await load_training_data(db_pool, after_vote_id)
+    finally:
+        await db_pool.close()
+
+def train_job(dsn: str,
+              seed: int = 228,
+              init_model_path: str | None = None,
+              after_vote_id: int = 0,
+              iterations: int = 1200,
+              reference_path: str | None = None,
+              thread_count: int = -1
+             ) -> tuple[CatBoostRegressor, dict[str, Any]]:
+    """
+    Обучение целиком, синхронно: загрузка голосов своим соединением, обучение и метаданные.
+    Модели читаются из файлов, а голоса - из базы, поэтому в процесс обучения передаются только пути и параметры,
+    а обратно - только модель и метаданные.
+    """
+    init_model = _load_model(init_model_path)
+    reference = _load_model(reference_path)
+    df = asyncio.run(_load_training_data(dsn, after_vote_id if init_model is not None else None))
+    model, metrics = fit_model(df, seed, init_model, after_vote_id, iterations, reference, thread_count)
+    meta = {
+        "mode": "full" if init_model is None else "incremental",
+        "votes": len(df) if init_model is None else int((df["vote_id"] > after_vote_id).sum()),
+        "users": int(df["user_id"].nunique()),
+        "max_vote_id": int(df["vote_id"].max()),
+        "trees": model.tree_count_,
+        **metrics,
+        "seed": seed
+    }
+    return model, meta
+
+@timed("train_model")
+async def train_model(dsn: str,
+                      model_path: str | None = None,
+                      seed: int = 228,
+                      init_model_path: str | None = None,
+                      after_vote_id: int = 0,
+                      iterations: int = 1200,
+                      reference_path: str | None = None,
+                      executor: TimedExecutor | None = None,
+                      thread_count: int = -1
+                     ) -> tuple[CatBoostRegressor, dict[str, Any]]:
+    """
+    Обучает CatBoost модель на данных из базы данных.
+    С `init_model_path` дообучает эту модель на голосах новее `after_vote_id` вместо обучения с нуля.
+    Модель `reference_path` оценивается на тех же отложенных голосах для сравнения.
+    Возвращает модель и её метаданные; с `model_path` модель ещё и сохраняется в файл.
+    Обучение вместе с загрузкой голосов идёт в `executor` (обычно отдельный процесс), без него - в пуле потоков по умолчанию.
+    """
+    args = (dsn, seed, init_model_path, after_vote_id, iterations, reference_path, thread_count)
+    if executor is not None:
+        model, meta = await executor.run(train_job, *args)
+    else:
+        model, meta = await asyncio.get_running_loop().run_in_executor(None, train_job, *args)
+    if model_path is not None:
+        model_path_obj = Path(model_path)
+        model_path_obj.parent.mkdir(parents=True, exist_ok=True)
+        model.save_model(str(model_path_obj))
+    return model, meta
+
+def make_split_leave1out(df: pd.DataFrame, user_col: str = "user_id", seed: int = 42) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    df["__is_test__"] = False
+
+    for _, g in df.groupby(user_col):
+        if len(g) <= 1:
+            continue
+        test_idx = rng.choice(g.index.to_numpy(), size=1)[0]
+        df.loc[test_idx, "__is_test__"] = True
+
+    mask = df["__is_test__"].astype(bool).to_numpy()
+    train = df.loc[~mask].drop(columns="__is_test__")
+    test = df.loc[mask].drop(columns="__is_test__")
+    return train, test
+
+def build_user_profile(train: pd.DataFrame, user_col: str = "user_id") -> pd.DataFrame:
+    agg = {
+        "u_mean_rating": ("rating", "mean"),
+        "u_std_rating": ("rating", "std"),
+        "u_cnt": ("rating", "size"),
+    }
+    for f in FEATURES:
+        agg[f"u_mean_{f}"] = (f, "mean")
+
+    prof = train.groupby(user_col).agg(**agg).reset_index()
+    prof["u_std_rating"] = prof["u_std_rating"].fillna(0.0)
+    return prof
+
+def add_features(df: pd.DataFrame, user_prof: pd.DataFrame, user_col: str = "user_id") -> pd.DataFrame:
+    out = df.merge(user_prof, on=user_col, how="left")
+
+    # Если пользователь вообще не встречался в train — заполним дефолтами
+    out["u_cnt"] = out["u_cnt"].fillna(0)
+    out["u_mean_rating"] = out["u_mean_rating"].fillna(out["rating"].mean())
+    out["u_std_rating"] = out["u_std_rating"].fillna(0.0)
+
+    for f in FEATURES:
+        out[f"u_mean_{f}"] = out[f"u_mean_{f}"].fillna(out[f].mean())
+        out[f"diff_{f}"] = (out[f].astype(float) - out[f"u_mean_{f}"].astype(float)).abs()
+
+    return out
+
+def get_feature_cols() -> list[str]:
+    return FEATURES + [f"diff_{f}" for f in FEATURES] + ["u_cnt", "u_mean_rating", "u_std_rating"]
+
+def rmse(model: CatBoostRegressor, rows: pd.DataFrame) -> float | None:
+    if len(rows) == 0:
+        return None
+    predictions = model.predict(rows[get_feature_cols()])
+    return float(np.sqrt(np.mean((predictions - rows["rating"].astype(float).to_numpy()) ** 2)))
+
+def fit_model(df: pd.DataFrame,
+              seed: int = 228,
+              init_model: CatBoostRegressor | None = None,
+              after_vote_id: int = 0,
+              iterations: int = 1200,
+              reference: CatBoostRegressor | None = None,
+              thread_count: int = -1
+             ) -> tuple[CatBoostRegressor, dict[str, float | None]]:
+    """
+    Обучение на голосах с признаками мест, синхронное. Возвращает модель и RMSE на отложенных
+    голосах (по одному на пользователя, leave-one-out): её (`rmse`) и модели `reference` (`reference_rmse`).
+    С `init_model` деревья добавляются к ней и обучаются только на голосах новее `after_vote_id`,
+    отложенные голоса выбираются из новых - их не видела ни одна из моделей.
+    """
     # Подготовка данных
-    train_raw, _ = make_split_leave1out(df, seed=seed)
+    if init_model is None:
+        train_raw, test_raw = make_split_leave1out(df, seed=seed)
+    else:
+        # Пятая часть новых голосов, не больше одного на пользователя и только у пользователей с другими голосами
+        new = df[df["vote_id"] > after_vote_id]
+        has_history = df.groupby("user_id")["vote_id"].transform("size").loc[new.index] > 1
+        candidates = new[has_history].groupby("user_id").sample(n=1, random_state=seed)
+        test_raw = candidates.sample(n=min(len(candidates), max(1, len(new) // 5)), random_state=seed)
+        train_raw = df.drop(index=test_raw.index)
     user_prof = build_user_profile(train_raw)
     train = add_features(train_raw, user_prof)
-    
+    test = add_features(test_raw, user_prof)
+    if init_model is not None:
+        train = train[train["vote_id"] > after_vote_id]
+        if len(train) == 0:
+            raise ValueError("No new votes available for training")
+
     # Подготовка признаков и целевой переменной
     feat_cols = get_feature_cols()
     X_train, y_train = train[feat_cols], train["rating"].astype(float)
-    
+
     # Обучение модели
     model = CatBoostRegressor(
-        iterations=1200,
+        iterations=iterations,
         depth=6,
         learning_rate=0.05,
         loss_function="RMSE",
         random_seed=seed,
+        thread_count=thread_count,
         verbose=False
     )
-    
-    model.fit(X_train, y_train)
 
-    # Сохранение модели
-    model_path_obj = Path(model_path)
-    model_path_obj.parent.mkdir(parents=True, exist_ok=True)
-    model.save_model(str(model_path_obj))
\ No newline at end of file
+    model.fit(X_train, y_train, init_model=init_model)
+    metrics = {
+        "rmse": rmse(model, test),
+        "reference_rmse": None if reference is None else rmse(reference, test),
+        "holdout": len(test)
+    }
+    return model, metrics
@@ -0,0 +1,206 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable
+from asyncpg import Connection, Pool
+from catboost import CatBoostRegressor
+from .model_store import ModelStore
+
+__all__ = ["ModelRejected", "TrainingScheduler"]
+
+# seed, файл дообучаемой модели, `max_vote_id` её голосов, файл модели для сравнения
+TrainFunc = Callable[
+    [int, str | None, int, str | None],
+    Awaitable[tuple[CatBoostRegressor, dict[str, Any]]]
+]
+
+class ModelRejected(Exception):
+    """Дообученная модель хуже последнего полного обучения больше допустимого."""
+
+class TrainingScheduler:
+    """
+    Фоновое обучение модели. Раз в `check_interval` секунд считает голоса новее обученной модели
+    и обучает новую версию, когда их не меньше `min_new_votes` или когда с прошлого обучения
+    прошло `interval` секунд и новые голоса есть. Без модели обучение начинается с первого голоса.
+    Из процессов сервиса обучает один (advisory lock), остальные подхватывают его версии с диска.
+
+    С `incremental` новая версия дообучает активную модель только на новых голосах, а с нуля модель
+    обучается раз в `full_interval` секунд. Дообученная версия публикуется, только если её RMSE
+    на отложенных новых голосах хуже RMSE модели последнего полного обучения на тех же голосах
+    не больше чем на `tolerance`; после отказа следующая версия обучается с нуля.
+    Если отложенных голосов меньше `min_holdout`, сравнение ничего не значит: дообученная версия
+    не публикуется, и та же проверка сразу обучает версию с нуля.
+    """
+    LOCK_KEY: str = "recsys_training"
+    NEW_VOTES_SQL: str = """
+        SELECT COUNT(*) AS new_votes, MAX(vote_id) AS max_vote_id
+        FROM votes
+        WHERE vote_id > $1;
+    """
+
+    def __init__(self,
+                 db_pool: Pool,
+                 store: ModelStore,
+                 train: TrainFunc,
+                 interval: float = 3600.0,
+                 min_new_votes: int = 500,
+                 check_interval: float = 30.0,
+                 incremental: bool = False,
+                 full_interval: float = 86400.0,
+                 tolerance: float = 0.05,
+                 min_holdout: int = 50,
+                 seed: int = 228
+                ) -> None:
+        self._db_pool: Pool = db_pool
+        self._store: ModelStore = store
+        self._train: TrainFunc = train
+        self._interval: float = interval
+        self._min_new_votes: int = min_new_votes
+        self._check_interval: float = check_interval
+        self._incremental: bool = incremental
+        self._full_interval: float = full_interval
+        self._tolerance: float = tolerance
+        self._min_holdout: int = min_holdout
+        self._seed: int = seed
+        self._force_full: bool = False
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._new_votes: int = 0
+        self._last_error: str | None = None
+        self._stats: dict[str, int] = {
+            "checks": 0,
+            "trainings": 0,
+            "full_trainings": 0,
+            "incremental_trainings": 0,
+            "rejected": 0,
+            "small_holdout": 0,
+            "failed": 0,
+            "skipped_locked": 0
+        }
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def training(self) -> bool:
+        return self._lock.locked()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except ModelRejected as e:
+                self._last_error = str(e)
+            except Exception as e:
+                self._stats["failed"] += 1
+                self._last_error = str(e)
+            await asyncio.sleep(self._check_interval)
+
+    async def check(self) -> int | None:
+        """Обучает новую версию, если пора; возвращает её номер."""
+        self._stats["checks"] += 1
+        # Чтение с диска и загрузка модели CatBoost не должны останавливать предсказания
+        await asyncio.get_running_loop().run_in_executor(None, self._store.load_latest)
+        meta = self._store.meta
+        async with self._db_pool.acquire() as conn:
+            conn: Connection
+            row = await conn.fetchrow(self.NEW_VOTES_SQL, meta.get("max_vote_id", 0))
+        self._new_votes = row["new_votes"]
+        if self._new_votes == 0:
+            return None
+        elapsed = time.time() - meta.get("trained_at", 0.0)
+        if self._store.version is None or self._new_votes >= self._min_new_votes or elapsed >= self._interval:
+            return await self.train(row["max_vote_id"])
+        return None
+
+    def _incremental_base(self) -> tuple[int, dict[str, Any], str, str] | None:
+        """
+        Версия и метаданные активной модели, файлы её и модели её полного обучения,
+        если следующую версию можно дообучить.
+        """
+        active = self._store.active
+        if not self._incremental or self._force_full or active is None:
+            return None
+        version, _, meta = active
+        # Без своей версии полного обучения сравнивать не с чем
+        if "max_vote_id" not in meta or "full_version" not in meta:
+            return None
+        if time.time() - meta.get("full_trained_at", 0.0) >= self._full_interval:
+            return None
+        # Обучение читает модели из файлов, а не получает их из этого процесса
+        model_path, reference_path = self._store.model_path(version), self._store.model_path(meta["full_version"])
+        if not model_path.exists() or not reference_path.exists():
+            return None
+        return version, meta, str(model_path), str(reference_path)
+
+    async def train(self, max_vote_id: int | None = None, seed: int | None = None, full: bool = False) -> int | None:
+        """
+        Обучает и публикует новую версию; `None`, если обучение уже идёт здесь или в другом процессе.
+        Дообученную версию хуже допустимого не публикует и поднимает `ModelRejected`.
+        """
+        if self._lock.locked():
+            self._stats["skipped_locked"] += 1
+            return None
+        async with self._lock:
+            async with self._db_pool.acquire() as conn:
+                conn: Connection
+                if not await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1));", self.LOCK_KEY):
+                    self._stats["skipped_locked"] += 1
+                    return None
+                try:
+                    base = None if full else self._incremental_base()
+                    seed = self._seed if seed is None else seed
+                    started = time.time()
+                    meta = None
+                    if base is not None:
+                        base_version, base_meta, base_path, reference_path = base
+                        model, meta = await self._train(seed, base_path, base_meta["max_vote_id"], reference_path)
+                        # Отложенных голосов нет, если новые голоса только у пользователей без истории
+                        if meta["holdout"] < self._min_holdout or meta["rmse"] is None or meta["reference_rmse"] is None:
+                            self._stats["small_holdout"] += 1
+                            meta = None
+                        else:
+                            meta["base_version"] = base_version
+                            meta["full_version"] = base_meta["full_version"]
+                            meta["full_trained_at"] = base_meta["full_trained_at"]
+                            limit = meta["reference_rmse"] * (1 + self._tolerance)
+                            if meta["rmse"] > limit:
+                                self._stats["rejected"] += 1
+                                self._force_full = True
+                                raise ModelRejected(f"Incremental model RMSE {meta['rmse']:.4f} is above {limit:.4f}")
+                    if meta is None:
+                        model, meta = await self._train(seed, None, 0, None)
+                        meta["full_trained_at"] = started
+                    # Голоса на неиндексированные места в обучение не попадают, но и новыми больше не считаются
+                    meta["max_vote_id"] = max(meta["max_vote_id"], max_vote_id or 0)
+                    meta["trained_at"] = time.time()
+                    meta["train_seconds"] = meta["trained_at"] - started
+                    version = await asyncio.get_running_loop().run_in_executor(None, self._store.publish, model, meta)
+                finally:
+                    await conn.execute("SELECT pg_advisory_unlock(hashtext($1));", self.LOCK_KEY)
+            self._stats["trainings"] += 1
+            self._stats[f"{meta['mode']}_trainings"] += 1
+            if meta["mode"] == "full":
+                self._force_full = False
+            self._new_votes = 0
+            return version
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._stats,
+            "training": self.training,
+            "new_votes": self._new_votes,
+            "min_new_votes": self._min_new_votes,
+            "interval": self._interval,
+            "incremental": self._incremental,
+            "full_interval": self._full_interval,
+            "min_holdout": self._min_holdout,
+            "last_error": self._last_error
+        }
@@ -0,0 +1,202 @@
+"""
+Пересчёт виртуальных оценок всех пользователей активной моделью, например после обучения новой версии:
+иначе оценки пользователя обновляются, только когда он снова оставит отзыв.
+Пользователи делятся на пачки по `--batch-size`. Голоса пачки читаются одним запросом, оценки считаются
+в пуле из `--workers` процессов (модель и признаки мест загружаются в процесс один раз), и оценки пачки
+заменяются в `virtual_scores` одной транзакцией через COPY. Режим хранения оценок берётся из `virtual_scores_state`,
+куда его записывает api; работает только с режимом `full`. После записи поколение оценок в `virtual_scores_state`
+увеличивается, и api сбрасывает кэш рекомендаций в течение `RECOMMENDATION_CACHE_SYNC_INTERVAL`.
+
+    python recompute_scores.py --dsn $DATABASE_URL --workers 4 --batch-size 64
+"""
+import os
+import sys
+import asyncio
+import argparse
+import multiprocessing
+from typing import Iterator
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from asyncpg import Connection, Pool, create_pool
+from catboost import CatBoostRegressor
+
+from core.places_catalog import FEATURES, PlacesCatalog
+from core.model_store import ModelStore
+from core.batch_scoring import load_users_votes, user_profiles, UserScorer
+
+# Режим хранения оценок api, см. миграцию `0005_virtual_scores_state` в api
+SCORES_MODE_SQL: str = """
+    SELECT mode
+    FROM virtual_scores_state;
+"""
+BUMP_GENERATION_SQL: str = """
+    UPDATE virtual_scores_state
+    SET generation = generation + 1;
+"""
+USERS_SQL: str = """
+    SELECT u.user_id
+    FROM users u
+    WHERE EXISTS (SELECT 1 FROM votes v WHERE v.user_id = u.user_id)
+    ORDER BY u.user_id;
+"""
+CREATE_STAGE_SQL: str = """
+    CREATE TEMP TABLE virtual_scores_stage (
+        user_id VARCHAR(100) NOT NULL,
+        place_id BIGINT NOT NULL,
+        score FLOAT NOT NULL
+    ) ON COMMIT DROP;
+"""
+# Те же блокировки, что у `UsersWorker.set_virtual_scores` в api, по возрастанию `user_id`
+LOCK_USERS_SQL: str = """
+    SELECT pg_advisory_xact_lock(hashtextextended(u, 0))
+    FROM unnest($1::text[]) AS u
+    ORDER BY u;
+"""
+CLEAR_SCORES_SQL: str = """
+    DELETE FROM virtual_scores
+    WHERE user_id = ANY($1::text[]);
+"""
+INSERT_STAGED_SQL: str = """
+    INSERT INTO virtual_scores (user_id, place_id, score)
+    SELECT user_id, place_id, score
+    FROM virtual_scores_stage;
+"""
+CLEAR_UNPROCESSED_SQL: str = """
+    UPDATE users
+    SET unprocessed_votes = 0
+    WHERE user_id = ANY($1::text[]);
+"""
+
+_scorer: UserScorer | None = None
+
+def _init_worker(model_path: str, places: np.ndarray, thread_count: int) -> None:
+    global _scorer
+    model = CatBoostRegressor()
+    model.load_model(model_path)
+    _scorer = UserScorer(model, places, thread_count=thread_count)
+
+def _score(profiles: np.ndarray) -> np.ndarray:
+    return _scorer.score(profiles)
+
+def score_records(user_ids: list[str], place_ids: np.ndarray, scores: np.ndarray) -> Iterator[tuple[str, int, float]]:
+    """Строки оценок для COPY; в памяти одновременно строки только одного пользователя."""
+    place_ids_list = place_ids.tolist()
+    for user_id, user_scores in zip(user_ids, scores):
+        for place_id, score in zip(place_ids_list, user_scores.tolist()):
+            yield user_id, place_id, score
+
+async def write_scores(conn: Connection, user_ids: list[str], place_ids: np.ndarray, scores: np.ndarray) -> None:
+    """
+    Заменяет оценки пользователей пачки одной транзакцией, как `UsersWorker.set_virtual_scores` в api:
+    COPY во временную таблицу, затем удаление и вставка. COPY сразу в секционированную `virtual_scores` медленнее.
+    """
+    records = score_records(user_ids, place_ids, scores)
+    async with conn.transaction():
+        await conn.execute(CREATE_STAGE_SQL)
+        await conn.copy_records_to_table("virtual_scores_stage", records=records, columns=["user_id", "place_id", "score"])
+        await conn.execute(LOCK_USERS_SQL, user_ids)
+        await conn.execute(CLEAR_SCORES_SQL, user_ids)
+        await conn.execute(INSERT_STAGED_SQL)
+        await conn.execute(CLEAR_UNPROCESSED_SQL, user_ids)
+
+class Progress:
+    def __init__(self, total: int, n_places: int, interval: float) -> None:
+        self._total: int = total
+        self._n_places: int = n_places
+        self._interval: float = interval
+        self._start: float = perf_counter()
+        self._last_report: float = self._start
+        self.done: int = 0
+
+    def add(self, users: int) -> None:
+        self.done += users
+        now = perf_counter()
+        if now - self._last_report >= self._interval:
+            self._last_report = now
+            self.report()
+
+    def report(self) -> None:
+        elapsed = perf_counter() - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self._total - self.done) / rate if rate > 0 else float("inf")
+        print(
+            f"{self.done}/{self._total} users  {elapsed:7.1f}s  {rate:8.1f} users/s  "
+            f"{rate * self._n_places:10.0f} scores/s  eta {eta:6.1f}s",
+            file=sys.stderr,
+            flush=True
+        )
+
+async def main(args: argparse.Namespace) -> int:
+    store = ModelStore(args.model_dir, legacy_path=args.model_path)
+    if not store.load_latest():
+        print("Model is not trained yet", file=sys.stderr)
+        return 1
+    model_path = str(store.model_path(store.version) if store.version else args.model_path)
+
+    pool: Pool = await create_pool(dsn=args.dsn, min_size=1, max_size=args.workers * 2 + 1)
+    written = 0
+    try:
+        async with pool.acquire() as conn:
+            mode = await conn.fetchval(SCORES_MODE_SQL)
+        if mode != "full":
+            print(f"Only the `full` virtual scores mode is supported, api uses `{mode}`", file=sys.stderr)
+            return 1
+        catalog = PlacesCatalog(pool, FEATURES, metadata=False)
+        catalog_version, place_ids, places = await catalog.indexed()
+        async with pool.acquire() as conn:
+            user_ids = [row["user_id"] for row in await conn.fetch(USERS_SQL)]
+        if args.limit:
+            user_ids = user_ids[:args.limit]
+        batches = [user_ids[i:i + args.batch_size] for i in range(0, len(user_ids), args.batch_size)]
+        print(
+            f"model version {store.version}, catalog version {catalog_version}: "
+            f"{len(user_ids)} users x {len(place_ids)} places in {len(batches)} batches",
+            file=sys.stderr
+        )
+        progress = Progress(len(user_ids), len(place_ids), args.report_interval)
+        loop = asyncio.get_running_loop()
+        # Пачек в работе вдвое больше процессов: пока одни считаются, другие читают голоса и пишут оценки
+        in_flight = asyncio.Semaphore(args.workers * 2)
+
+        with ProcessPoolExecutor(
+            args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path, places, args.thread_count)
+        ) as executor:
+            async def run_batch(batch: list[str]) -> None:
+                nonlocal written
+                async with in_flight:
+                    async with pool.acquire() as conn:
+                        votes = await load_users_votes(conn, batch, FEATURES)
+                    scores = await loop.run_in_executor(executor, _score, user_profiles(votes, batch))
+                    if not args.dry_run:
+                        async with pool.acquire() as conn:
+                            await write_scores(conn, batch, place_ids, scores)
+                        written += len(batch)
+                    progress.add(len(batch))
+
+            await asyncio.gather(*[run_batch(batch) for batch in batches])
+    finally:
+        # Кэш рекомендаций api сбрасывается и после частичного пересчёта
+        if written:
+            async with pool.acquire() as conn:
+                await conn.execute(BUMP_GENERATION_SQL)
+        await pool.close()
+    progress.report()
+    return 0
+
+if __name__ == "__main__":
+    model_path = os.getenv("MODEL_PATH", "/models/model.cbm")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--model-path", default=model_path)
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", os.path.dirname(model_path)))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes")
+    parser.add_argument("--thread-count", type=int, default=1, help="CatBoost threads per process")
+    parser.add_argument("--batch-size", type=int, default=64, help="users per batch")
+    parser.add_argument("--limit", type=int, default=0, help="recompute only the first N users")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true", help="score without writing")
+    sys.exit(asyncio.run(main(parser.parse_args())))